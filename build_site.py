@@ -1,17 +1,27 @@
-from naslagwerk.utils import Stopwatch, load_ini, write_ini
+from naslagwerk.utils import Stopwatch, is_true, load_ini, write_ini
 
 stopwatch = Stopwatch()
 
 import argparse
 
+
+def selector(item):
+    key, _, values = item.partition('=')
+    if key not in ['section', 'chapter', 'page_id', 'path'] or not values:
+        raise argparse.ArgumentTypeError(f'ongeldige selector "{item}"')
+    return key, values.split(',')
+
+
 parser = argparse.ArgumentParser(description='Build static site')
 parser.add_argument(
     'naslagwerk',
+    nargs='+',
     help=("""
 locatie van naslagwerk directory;
 mag volledig pad zijn;
 indien alleen naam van naslagwerk is opgegeven,
-dan zoekt script in parent directory.
+dan zoekt script in parent directory;
+meerdere naslagwerken worden samen in één run gebouwd.
 """))
 parser.add_argument(
     '-c', '--clean',
@@ -28,9 +38,54 @@ parser.add_argument(
     choices=['pages', 'folders'],
     default=[],
     help='skip pages and/or folders')
+parser.add_argument(
+    '-a', '--asyncio',
+    help='set flag to build pages with staged asyncio pipeline',
+    action='store_true',
+    default=False)
+parser.add_argument(
+    '-o', '--only',
+    nargs='*',
+    type=selector,
+    default=[],
+    metavar='KEY=VALUE',
+    help=(
+        'only build selected pages and the pages depending on them; '
+        'select by section, chapter, page_id or path (glob), '
+        'e.g. section=Inschrijving or page_id=abcd1234,ef567890'))
+parser.add_argument(
+    '-g', '--git-dates',
+    help='set flag to take page created/modified dates from git history',
+    action='store_true',
+    default=False)
+parser.add_argument(
+    '-m', '--metrics',
+    default=None,
+    metavar='FILE',
+    help=(
+        'write build metrics to FILE: Prometheus textfile if FILE ends '
+        'with .prom, otherwise appended as JSON line'))
+output = parser.add_mutually_exclusive_group()
+output.add_argument(
+    '-z', '--archive',
+    choices=['zip', 'tar', 'tar.gz'],
+    default=None,
+    help='write output straight into archive next to output folder')
+output.add_argument(
+    '-t', '--stage',
+    nargs='?',
+    const='',
+    default=None,
+    metavar='DIR',
+    help=(
+        'build in local staging directory (default in temp folder) '
+        'and publish only changed files to output folder'))
 args = parser.parse_args()
+if args.archive and (args.only or args.skip):
+    # the archive is written from scratch, so it would only hold this run's files
+    parser.error('--archive schrijft een volledig archief en kan niet samen met --only/--skip')
 
-title = f"BUILD SITE :: {args.naslagwerk}"
+title = f"BUILD SITE :: {', '.join(args.naslagwerk)}"
 header = f"""
 +==================================================================+
 |{title:^66}|
@@ -39,6 +94,12 @@ header = f"""
    clean output folder?  {args.clean}
    create new version?   {args.version}
    skip sections?        {args.skip}
+   asyncio pipeline?     {args.asyncio}
+   only selected pages?  {args.only}
+   dates from git?       {args.git_dates}
+   output to archive?    {args.archive}
+   stage and publish?    {args.stage is not None}
+   write metrics to?     {args.metrics}
 """
 print(header)
 print('imports', flush=True, end=' ')
@@ -46,132 +107,331 @@ print('imports', flush=True, end=' ')
 import json
 import shutil
 from pathlib import Path
+from time import perf_counter, time
+from types import SimpleNamespace
 from filecmp import dircmp
 from datetime import date
 from multiprocessing.dummy import Pool
 
 from naslagwerk.config import Config
-from naslagwerk.site import Topography, make_environment
+from naslagwerk.site import Topography, make_environment, select_page_ids
 from naslagwerk.page import Page
+from naslagwerk.snapshot import BuildContext
+from naslagwerk.pipeline import Stage, pipeline
+from naslagwerk.store import PageStore
+from naslagwerk.archive import Archive
+from naslagwerk.publish import publish, staging_dir, write_manifest
+from naslagwerk.history import git_dates
+from naslagwerk.precache import Precache, write_precache
+from naslagwerk.telemetry import Progress, write_metrics
 
 stopwatch.split()
 
 # init
 print('init', flush=True)
 
-pool = Pool(6)
-
-print("- laad config")
-path = Path(args.naslagwerk)
-if len(path.parts) == 1:
-    path = '..' / path
-configfile = path / 'config.ini'
-config = Config(configfile)
-if not configfile.exists():
-    config.write_ini()
-PATHS = config.PATHS
-
-print("- laad topografie")
-if not PATHS.topography.exists():
-    raise FileNotFoundError("""
+WORKERS = 6
+pool = Pool(WORKERS)
+timings = {}
+progress = None
+
+
+def load_site(naslagwerk):
+    print(f"- laad config «{naslagwerk}»")
+    path = Path(naslagwerk)
+    if len(path.parts) == 1:
+        path = '..' / path
+    configfile = path / 'config.ini'
+    config = Config(configfile)
+    if not configfile.exists():
+        config.write_ini()
+    PATHS = config.PATHS
+    publish_to = None
+    if args.stage is not None:
+        publish_to = config.WORKDIR / config.parser['PATHS'].getpath('output')
+        staging = Path(args.stage) / path.name if args.stage else staging_dir(publish_to)
+        PATHS = SimpleNamespace(**{**vars(PATHS), 'output': staging})
+        print(f"- staging in «{staging}»")
+
+    print("- laad topografie")
+    if not PATHS.topography.exists():
+        raise FileNotFoundError("""
   Topografie niet gevonden.
   1. Heeft de site al een topografie?
      ---> controleer path in config.ini
   2. Ben je de site aan het initialiseren?
      ---> run eerst build_topography.py om topografie aan te maken
 """)
-topo = Topography.read_excel(PATHS.topography)
-
-print("- laad changelog")
-if not PATHS.changelog.exists():
-    PATHS.changelog.touch()
-    init = {
-        "v0.1": {
-            "date": date.today().strftime('%Y-%m-%d'),
-            "comment": "Eerste oplevering."
+    topo = Topography.read_excel(PATHS.topography)
+
+    print("- laad changelog")
+    if not PATHS.changelog.exists():
+        PATHS.changelog.touch()
+        init = {
+            "v0.1": {
+                "date": date.today().strftime('%Y-%m-%d'),
+                "comment": "Eerste oplevering."
+            }
         }
-    }
-    PATHS.changelog.write_text(json.dumps(init), encoding='utf8')
-chlog = json.loads(PATHS.changelog.read_text(encoding='utf8'))
+        PATHS.changelog.write_text(json.dumps(init), encoding='utf8')
+    chlog = json.loads(PATHS.changelog.read_text(encoding='utf8'))
 
-stopwatch.split()
-info = f"""
+    stopwatch.split()
+    info = f"""
    +------------------------------------------------------------+
    | title:   {config.PROPERTIES.title:<50}|
    | version: {config.PROPERTIES.version:<50}|
    | pages:   {len(topo.data):<50}|
    +------------------------------------------------------------+
 """
-print(info)
+    print(info)
 
-if args.clean:
-    print('clean output directory')
+    if args.clean:
+        print('clean output directory')
 
-    shutil.rmtree(PATHS.output)
-    stopwatch.split()
-    stopwatch.split()
+        if PATHS.output.exists():
+            shutil.rmtree(PATHS.output)
+        stopwatch.split()
+
+    if args.version:
+        new_version = input("New version: ")
+        comment = input("Comment for changelog: ")
+        print()
 
-if args.version:
-    new_version = input("New version: ")
-    comment = input("Comment for changelog: ")
-    print()
+        chlog[new_version] = {'date': str(date.today()), 'comment': comment}
+        PATHS.changelog.write_text(json.dumps(chlog), encoding='utf8')
+        config.parser['PROPERTIES']['version'] = new_version
+        config.write_ini()
+        stopwatch.split()
 
-    chlog[new_version] = {'date': str(date.today()), 'comment': comment}
-    PATHS.changelog.write_text(json.dumps(chlog), encoding='utf8')
-    config.parser['PROPERTIES']['version'] = new_version
-    config.write_ini()
+    print('snapshot', flush=True, end=' ')
+    context = BuildContext.from_build(config, topo, chlog)
+    environment = make_environment(context, context, context.changelog)
+    print(f'<{context.fingerprint[:12]}>', end=' ')
     stopwatch.split()
 
-environment = make_environment(config, topo, chlog)
+    return SimpleNamespace(
+        name=path.name,
+        PATHS=PATHS,
+        topo=topo,
+        context=context,
+        environment=environment,
+        archive=Archive.for_output(PATHS.output, args.archive) if args.archive else None,
+        publish_to=publish_to,
+        precache=Precache(),
+        offline=config.PROPERTIES.offline,
+        manifest={},
+        changes=None,
+        done=[],
+    )
+
+
+sites = [load_site(naslagwerk) for naslagwerk in args.naslagwerk]
+start = perf_counter()
 
 # pages
 if not 'pages' in args.skip:
     print('pages')
 
-    def write_page(md):
-        print(f' «{md.name}»')
-        page = Page.read_md(md, config, topo, environment)
-        if page is not None:
-            page.write(PATHS.output)
+    tasks = []
+    for site in sites:
+        PATHS = site.PATHS
+        store = PageStore(PATHS.store)
+        site.changes = store.refresh(PATHS.content, pool.map)
+        entries = store.entries()
+        if args.git_dates:
+            cache = PATHS.store.with_suffix('.dates.json')
+            dates = git_dates(PATHS.content, cache)
+            for entry in entries:
+                entry.ctime, entry.mtime = dates.get(
+                    str(entry.path), (entry.ctime, entry.mtime))
+        if args.only:
+            page_ids = select_page_ids(args.only, site.topo, entries, PATHS.content)
+            entries = [entry for entry in entries if entry.page_id in page_ids]
+        tasks.extend((site, entry) for entry in entries)
 
-    pool.map(write_page, PATHS.content.glob('**/*.md'))
-    stopwatch.split()
+    def write_page(task):
+        with progress.track():
+            item = read_page(task)
+            if item is not None:
+                save_page(render_page(item))
+
+    def read_page(task):
+        site, entry = task
+        page = Page.from_entry(entry, site.context, site.context, site.environment)
+        return (site, page) if page is not None else None
+
+    def render_page(item):
+        site, page = item
+        return site, page, page.render()
+
+    def save_page(item):
+        site, page, html = item
+        if site.archive is not None:
+            site.archive.write_text(page.context['href'], html)
+            for href, text in page.files.items():
+                site.archive.write_text(href, text)
+        else:
+            page.write(site.PATHS.output, html=html)
+        site.precache.add(page.context['href'], html)
+        for href, text in page.files.items():
+            site.precache.add(href, text)
+        site.done.append(perf_counter())
+
+    if args.asyncio:
+        stages = [
+            Stage('read', read_page, workers=4),
+            Stage('render', render_page, workers=6),
+            Stage('write', save_page, workers=4),
+        ]
+        with Progress(len(tasks), stages=stages) as progress:
+            pipeline(tasks, stages)
+        for stage in stages:
+            print(stage.report())
+    else:
+        with Progress(len(tasks), workers=WORKERS) as progress:
+            pool.map(write_page, tasks)
+    timings['pages'] = stopwatch.split()
 
 # copy
 if not 'folders' in args.skip:
     print('folders')
 
     def copy_files(task):
+        """
+        Copy new and changed files; returns the report lines, which are
+        printed after the pool is done so the lines of workers don't mix.
+        """
         key, src, dst = task
         src.mkdir(exist_ok=True, parents=True)
         dst.mkdir(exist_ok=True, parents=True)
         cmp = dircmp(src, dst)
         files = [f for f in cmp.left_list if f not in cmp.same_files]
-        print(f" «{key}»{'::': >{16-len(key)}} {len(files)} files")
+        report = [f" «{key}»{'::': >{max(16-len(key), 3)}} {len(files)} files"]
         for file in files:
             try:
                 shutil.copyfile(src / file, dst / file)
             except PermissionError:
-                print(f'geen toestemming om "{file}" te kopiëren')
-
-    folders_to_copy = [
-        ('iframes',
-            PATHS.content / 'iframes',
-            PATHS.output / 'iframes'),
-        ('images',
-            PATHS.content / 'images',
-            PATHS.output / 'images'),
-        ('css-defaults',
-            PATHS.defaults / 'styles',
-            PATHS.output / 'css'),
-    ]
-    custom_folders_to_copy = [
-        ('css-custom',
-            PATHS.templates / 'styles',
-            PATHS.output / 'css'),
-    ]
-    pool.map(copy_files, folders_to_copy)
-    pool.map(copy_files, custom_folders_to_copy)
-    stopwatch.split()
+                report.append(f'geen toestemming om "{file}" te kopiëren')
+        return '\n'.join(report)
+
+    def folders(PATHS):
+        folders_to_copy = [
+            ('iframes',
+                PATHS.content / 'iframes',
+                PATHS.output / 'iframes'),
+            ('images',
+                PATHS.content / 'images',
+                PATHS.output / 'images'),
+            ('css-defaults',
+                PATHS.defaults / 'styles',
+                PATHS.output / 'css'),
+        ]
+        custom_folders_to_copy = [
+            ('css-custom',
+                PATHS.templates / 'styles',
+                PATHS.output / 'css'),
+        ]
+        return folders_to_copy, custom_folders_to_copy
 
-stopwatch.total()
+    def assets(PATHS):
+        """
+        Dict of output href -> source file; custom files override defaults.
+        """
+        assets = {}
+        for key, src, dst in sum(folders(PATHS), []):
+            files = [f for f in src.glob('*') if f.is_file()]
+            for file in files:
+                arcname = (dst / file.name).relative_to(PATHS.output)
+                assets[arcname.as_posix()] = file
+        return assets
+
+    def archive_files(site):
+        tasks = [(src, arcname) for arcname, src in assets(site.PATHS).items()]
+        written = pool.starmap(site.archive.write_file, tasks)
+        print(f" «{site.name}»{'::': >{16-len(site.name)}} {sum(written)} files")
+
+    folders_to_copy = []
+    custom_folders_to_copy = []
+    for site in sites:
+        if site.archive is not None:
+            archive_files(site)
+            continue
+        default, custom = folders(site.PATHS)
+        if len(sites) > 1:
+            name = lambda tasks: [(f"{site.name}/{key}", src, dst) for key, src, dst in tasks]
+            default, custom = name(default), name(custom)
+        folders_to_copy += default
+        custom_folders_to_copy += custom
+    for report in pool.map(copy_files, folders_to_copy):
+        print(report)
+    for report in pool.map(copy_files, custom_folders_to_copy):
+        print(report)
+    for site in sites:
+        pool.starmap(site.precache.add_file, assets(site.PATHS).items())
+    timings['folders'] = stopwatch.split()
+
+# manifests
+print('manifests')
+for site in sites:
+    offline = is_true(site.offline)
+    # only a full build knows all files of the site
+    full = not (args.only or args.skip)
+    site.manifest = write_precache(
+        site.precache, site.environment, site.PATHS.output, site.archive,
+        worker=offline, full=full, live=site.publish_to)
+    write_manifest(site.manifest, site.PATHS.output, site.archive)
+    print(f" «{site.name}»{'::': >{16-len(site.name)}} {len(site.manifest)} files in manifest")
+timings['manifests'] = stopwatch.split()
+
+# archive
+for site in sites:
+    if site.archive is not None:
+        site.archive.close()
+        print(
+            f"archive «{site.archive.path.name}» {len(site.archive.names)} files"
+            f" ({site.archive.deduplicated} deduplicated)")
+
+# publish
+if args.stage is not None:
+    print('publish')
+    for site in sites:
+        # only a full build tells which live files are gone
+        prune = not (args.only or args.skip)
+        result = publish(site.PATHS.output, site.publish_to, pool.map, prune=prune)
+        print(
+            f" «{site.name}»{'::': >{16-len(site.name)}} {result.changed} changed,"
+            f" {result.removed} removed, {result.kept} kept ({result.mode})")
+    timings['publish'] = stopwatch.split()
+
+# report
+if not 'pages' in args.skip:
+    print('report')
+    for site in sites:
+        changes = site.changes
+        finished = max(site.done, default=start) - start
+        print(
+            f" «{site.name}»{'::': >{16-len(site.name)}} {len(site.done)} pages"
+            f" | store: {changes.added} new, {changes.changed} changed,"
+            f" {changes.removed} removed"
+            f" | done after {stopwatch.format_time(finished)}")
+
+timings['total'] = stopwatch.total()
+
+# metrics
+if args.metrics:
+    record = {
+        'time': round(time(), 3),
+        'stages': timings,
+        'pages': progress.metrics() if progress is not None else None,
+        'sites': {
+            site.name: {
+                'pages': len(site.done),
+                **(vars(site.changes) if site.changes is not None else {}),
+                'files': len(site.manifest),
+            }
+            for site in sites
+        },
+    }
+    write_metrics(args.metrics, record)
+    print(f"metrics written to «{args.metrics}»")
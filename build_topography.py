@@ -11,7 +11,7 @@ This script builds or rebuilds the site topography within the naslagwerk folder
     * No duplicates.
     If topography is invalid break script.
 3. For rows lacking `page_id`, create and add unique `page_id`.
-4. Loop over .md files in content folder and for every file:
+4. Refresh the page store (only new or changed .md files in content folder are read) and plan the reconciliation for every file:
     * Check `page_id`:
         - if `page_id` is unknown, prompt user to delete file.
         (These files will be ignored when building site; however for maintainability it may be advisable to clean this files up.)
@@ -22,7 +22,8 @@ This script builds or rebuilds the site topography within the naslagwerk folder
     If not: rename the path and/or filename.
 5. Check if all `page_ids` have associated .md file. If not:
     - Create .md file following naming convention above.
-6. Save topography in "topography.xlsx".
+6. Apply the planned renames, creates and deletes in one batch (with the `--dry-run` flag the plan is only shown and the script stops here).
+7. Save topography in "topography.xlsx", but only if page ids, order or filled values changed (an unchanged file keeps its timestamp).
 
 Make sure that section_oder, chapter_order and group_order are filled for each page in the topography. If there are no groups within a chapter or no chapters within a section the order value should be 1.
 
@@ -43,6 +44,11 @@ parser.add_argument(
         'indien alleen naam van naslagwerk is opgegeven, '
         'dan zoekt script in parent directory')
 )
+parser.add_argument(
+    '-n', '--dry-run',
+    help='set flag to only show planned renames, creates and deletes',
+    action='store_true',
+    default=False)
 args = parser.parse_args()
 
 header = """
@@ -55,16 +61,23 @@ print('imports', flush=True, end=' ')
 
 from multiprocessing.dummy import Pool
 from pathlib import Path
+from types import SimpleNamespace
 from uuid import uuid4
 
+import numpy as np
 import pandas as pd
 
 from naslagwerk.config import Config
+from naslagwerk.store import PageStore
 
 stopwatch.split()
 
 
 def load_topography(path):
+    """
+    Return normalised topography and the table as read (None if there is no
+    topography yet).
+    """
     if not path.exists():
         print('\nGeen topografie gevonden ---> nieuwe aanmaken')
         return pd.DataFrame({
@@ -78,35 +91,62 @@ def load_topography(path):
             'page_order':    [1],
             'page':          ['Home'],
             'code':          [None],
-        })
+        }), None
     else:
-        df = pd.read_excel(path).rename(columns=str.lower)
-        todo = {i[:-6]:i for i in df.filter(like='_order').columns}
-        df = df.sort_values(list(todo.values()))
-        grouper = []
-        for col, ordercol in todo.items():
-            grouper.append(ordercol)
-            s = df.groupby(grouper)[col].transform(pd.Series.ffill)
-            df = df.assign(**{col: s})
-        return df
+        original = pd.read_excel(path).rename(columns=str.lower)
+        return normalise(original), original
+
+
+def normalise(df):
+    """
+    Sort topography on the order columns and forward fill every level within
+    its parent levels in a single pass over the sorted rows: a level's group
+    starts where any of its order columns changes, and a value is carried
+    down only from a row within the same group.
+    """
+    todo = {i[:-6]:i for i in df.filter(like='_order').columns}
+    df = df.sort_values(list(todo.values()), kind='stable')
+    positions = np.arange(len(df))
+    new_group = np.zeros(len(df), dtype=bool)
+    new_group[:1] = True
+    filled = {}
+    for col, ordercol in todo.items():
+        order = df[ordercol].to_numpy()
+        new_group[1:] |= ~(order[1:] == order[:-1])
+        start = np.maximum.accumulate(np.where(new_group, positions, 0))
+        source = np.maximum.accumulate(np.where(df[col].notna(), positions, -1))
+        values = df[col].take(np.maximum(source, 0))
+        filled[col] = values.where(source >= start).set_axis(df.index)
+    return df.assign(**filled)
 
 
 def check_df(df):
     cols = [i for i in df.columns if i.endswith('_order')]
-    test = df[['section', 'page', *cols]]
-    hasnans = test.isna().any(axis=None)
-    assert not hasnans, (f"""
+    nans = df[['section', 'page', *cols]].isna().any(axis=1)
+    assert not nans.any(), (f"""
 Fout in topografie: missende waarden
--- zie rijen: {test[test.isna().any(axis=1)].index.values + 2}
+-- zie rijen: {nans[nans].index.values + 2}
 """)
-    test = df[cols]
-    hasdupes = test.duplicated().any()
-    assert not hasdupes, (f"""
+    dupes = df.duplicated(cols, keep=False)
+    assert not dupes.any(), (f"""
 Fout in topografie: dubbeling in volgorde
--- zie rijen: {test[test.duplicated(keep=False)].index.values + 2}
+-- zie rijen: {dupes[dupes].index.values + 2}
 """)
 
 
+def is_changed(df, original):
+    """
+    True if topography ``df`` differs from the table as read (in page ids,
+    row order or any value), i.e. if the topography file must be written.
+    """
+    if original is None:
+        return True
+    original = original.set_index('page_id').fillna(value='')
+    if not (df.index.equals(original.index) and df.columns.equals(original.columns)):
+        return True
+    return not (df.astype(object).to_numpy() == original.astype(object).to_numpy()).all()
+
+
 def make_id_generator(page_ids):
     def generate_id():
         "Generate a unique id."
@@ -135,12 +175,36 @@ def path_from_record(s):
     return f"{section_order}_{section}/{filename}"
 
 
-def find_id(path):
-    text = path.read_text(encoding='utf-8')
-    if not '\n' in text:
-        return
-    page_id, _ = text.split('\n', 1)
-    return path, page_id, page_id in df.index
+def make_plan(results):
+    """
+    Compare the scanned files with the topography and plan the reconciliation:
+    - renames: (path, expected_path) for known files on the wrong path
+    - deletes: (path, page_id) for files with an unknown page_id
+    - creates: (page_id, path) for page_ids without a file
+    """
+    expected = df.apply(path_from_record, axis=1).map(PATHS.content.joinpath)
+    renames, deletes, seen = [], [], set()
+    for path, page_id, found in results:
+        if not found:
+            deletes.append((path, page_id))
+            continue
+        seen.add(page_id)
+        if not path == expected[page_id]:
+            renames.append((path, expected[page_id]))
+    creates = [(pid, path) for pid, path in expected.items() if pid not in seen]
+    return SimpleNamespace(renames=renames, deletes=deletes, creates=creates)
+
+
+def show_plan(plan):
+    rel = lambda path: path.relative_to(PATHS.content)
+    for path, expected_path in plan.renames:
+        print(f" rename «{rel(path)}» -> «{rel(expected_path)}»")
+    for label, items in [
+        ('create', [path for _, path in plan.creates]),
+        ('delete', [path for path, _ in plan.deletes]),
+    ]:
+        for path in items:
+            print(f" {label} «{rel(path)}»")
 
 
 def prompt_delete(path, page_id):
@@ -157,22 +221,22 @@ def prompt_delete(path, page_id):
         path.unlink()
 
 
-def rename_file(path, page_id):
-    expected_path = PATHS.content / path_from_record(df.loc[page_id])
-    if not path == expected_path:
+def apply_plan(plan):
+    """
+    Execute the reconciliation plan; all target directories are created once
+    up front before files are moved and written in a batch.
+    """
+    targets = [dst for _, dst in plan.renames] + [p for _, p in plan.creates]
+    for folder in {path.parent for path in targets}:
+        folder.mkdir(parents=True, exist_ok=True)
+    for path, expected_path in plan.renames:
         print(f' «{expected_path.name}»')
-        if not expected_path.parent.exists():
-            expected_path.parent.mkdir(parents=True, exist_ok=True)
         path.rename(expected_path)
-
-
-def make_file(page_id):
-    file_path = PATHS.content / path_from_record(df.loc[page_id])
-    print(f' «{file_path.name}»')
-    if not file_path.parent.exists():
-        file_path.parent.mkdir(parents=True, exist_ok=True)
-    text = page_id + '\n'
-    file_path.write_text(text, encoding='utf-8')
+    for page_id, file_path in plan.creates:
+        print(f' «{file_path.name}»')
+        file_path.write_text(page_id + '\n', encoding='utf-8')
+    for path, page_id in plan.deletes:
+        prompt_delete(path, page_id)
 
 
 if __name__ == '__main__':
@@ -191,7 +255,7 @@ if __name__ == '__main__':
 
     # loading topography
     print('load topofile', flush=True, end=' ')
-    df = load_topography(PATHS.topography)
+    df, original = load_topography(PATHS.topography)
     check_df(df)
     stopwatch.split()
 
@@ -205,36 +269,34 @@ if __name__ == '__main__':
 
     # finding page ids
     print('finding page_ids', flush=True, end=' ')
-    files = PATHS.content.glob('**/*.md')
     pool = Pool(6)
-    results = pool.map(find_id, files)
-    found = [(path, pid) for path, pid, found in results if found]
-    not_found = [(path, pid) for path, pid, found in results if not found]
+    store = PageStore(PATHS.store)
+    store.refresh(PATHS.content, pool.map, parse=False)
+    results = [(path, pid, pid in df.index) for path, pid in store.page_ids()]
     stopwatch.split()
 
-    # renaming updated files
-    if found:
-        print('renaming updated files', flush=True)
-        pool.starmap(rename_file, found)
-        stopwatch.split()
-
-    # deleting unknown files
-    if not_found:
-        print('deleting unknown files', flush=True)
-        for path, page_id in not_found:
-            prompt_delete(path, page_id)
-        stopwatch.split()
-
-    # create files for new page ids
-    print('creating files', flush=True)
-    new_ids = set(df.index.values) - set(pid for _, pid in found)
-    pool.map(make_file, new_ids)
+    # planning reconciliation
+    print('planning reconciliation', flush=True, end=' ')
+    plan = make_plan(results)
+    stopwatch.split()
+
+    if args.dry_run:
+        print('dry run', flush=True)
+        show_plan(plan)
+        stopwatch.total()
+        raise SystemExit
+
+    # applying plan
+    print('applying plan', flush=True)
+    apply_plan(plan)
     stopwatch.split()
 
     # save topography file
-    print('save topography', flush=True, end=' ')
-    writer = pd.ExcelWriter(PATHS.topography)
-    df.to_excel(writer, 'site_topography')
-    writer.save()
+    if is_changed(df, original):
+        print('save topography', flush=True, end=' ')
+        with pd.ExcelWriter(PATHS.topography) as writer:
+            df.to_excel(writer, sheet_name='site_topography')
+    else:
+        print('topography unchanged', flush=True, end=' ')
     stopwatch.split()
     stopwatch.total()
@@ -0,0 +1,49 @@
+"""
+deploy_delta script
+===================
+Compare the deploy manifest of the last deployed build with that of a new
+build and list the files to upload and to delete. Every build writes its
+manifest ("manifest.json", relative path -> content hash) in the root of the
+output folder (or archive).
+
+    python deploy_delta.py deployed/manifest.json ../naslagwerk/output
+
+Arguments are manifest files or output folders. A missing old manifest
+counts as empty, so the first deploy uploads everything. The text output
+has one line per file, prefixed with A (added), M (changed) or D (removed);
+with ``--json`` the lists are written as a json object. After a successful
+upload, keep the new manifest as the deployed one.
+"""
+import argparse
+import json
+import sys
+
+from naslagwerk.publish import compare, read_manifest
+
+
+parser = argparse.ArgumentParser(description='Compare deploy manifests')
+parser.add_argument(
+    'old',
+    help='manifest (of output folder) van laatst gedeployde build')
+parser.add_argument(
+    'new',
+    help='manifest (of output folder) van nieuwe build')
+parser.add_argument(
+    '-j', '--json',
+    help='set flag to write added/changed/removed lists as json',
+    action='store_true',
+    default=False)
+args = parser.parse_args()
+
+delta = compare(read_manifest(args.old), read_manifest(args.new))
+if args.json:
+    json.dump(vars(delta), sys.stdout, indent=2)
+    print()
+else:
+    for status, paths in zip('AMD', [delta.added, delta.changed, delta.removed]):
+        for path in paths:
+            print(f"{status}\t{path}")
+print(
+    f"{len(delta.added)} added, {len(delta.changed)} changed,"
+    f" {len(delta.removed)} removed",
+    file=sys.stderr)
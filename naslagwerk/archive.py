@@ -0,0 +1,86 @@
+import hashlib
+import tarfile
+import time
+import zipfile
+from io import BytesIO
+from pathlib import Path
+from threading import Lock
+
+
+class Archive:
+    """
+    Thread-safe writer that streams output files straight into a zip or tar
+    archive. Every arcname is written once; in tar archives files with the
+    same content as an earlier file are stored as hard link to that file.
+    """
+    FORMATS = {
+        'zip': None,
+        'tar': 'w',
+        'tar.gz': 'w:gz',
+    }
+
+    def __init__(self, path, format='zip'):
+        if format not in self.FORMATS:
+            raise ValueError(f"onbekend archiefformaat: {format}")
+        self.path = Path(path)
+        self.format = format
+        self.lock = Lock()
+        self.names = set()
+        self.hashes = {}
+        self.deduplicated = 0
+        if format == 'zip':
+            self.archive = zipfile.ZipFile(self.path, 'w', zipfile.ZIP_DEFLATED)
+        else:
+            self.archive = tarfile.open(self.path, self.FORMATS[format])
+
+    @classmethod
+    def for_output(cls, output, format='zip'):
+        """
+        Archive next to the output folder, e.g. "output" -> "output.zip".
+        """
+        output = Path(output)
+        return cls(output.parent / f"{output.name}.{format}", format)
+
+    def write(self, arcname, data):
+        """
+        Add ``data`` (bytes) to the archive as ``arcname``. Returns False if
+        ``arcname`` was already written.
+        """
+        digest = hashlib.sha1(data).hexdigest()
+        with self.lock:
+            if arcname in self.names:
+                return False
+            self.names.add(arcname)
+            original = self.hashes.setdefault(digest, arcname)
+            if self.format == 'zip':
+                info = zipfile.ZipInfo(arcname, time.localtime()[:6])
+                info.compress_type = zipfile.ZIP_DEFLATED
+                self.archive.writestr(info, data)
+            elif not original == arcname:
+                info = tarfile.TarInfo(arcname)
+                info.type = tarfile.LNKTYPE
+                info.linkname = original
+                info.mtime = time.time()
+                self.archive.addfile(info)
+                self.deduplicated += 1
+            else:
+                info = tarfile.TarInfo(arcname)
+                info.size = len(data)
+                info.mtime = time.time()
+                self.archive.addfile(info, BytesIO(data))
+        return True
+
+    def write_text(self, arcname, text, encoding='utf-8'):
+        return self.write(arcname, text.encode(encoding))
+
+    def write_file(self, src, arcname):
+        return self.write(arcname, Path(src).read_bytes())
+
+    def close(self):
+        self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
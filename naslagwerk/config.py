@@ -1,3 +1,5 @@
+import hashlib
+import tempfile
 from configparser import ConfigParser
 from pathlib import Path
 from types import SimpleNamespace
@@ -21,6 +23,16 @@ class Config:
     def WORKDIR(self):
         return self.path.parent.absolute().resolve()
 
+    @property
+    def CACHEDIR(self):
+        """
+        Local folder of the user (in the temp folder, one per naslagwerk) for
+        the page store and render caches, so these stay off the shared drive
+        the naslagwerk lives on.
+        """
+        key = hashlib.sha1(str(self.WORKDIR).encode('utf8')).hexdigest()[:8]
+        return Path(tempfile.gettempdir()) / 'naslagwerk' / 'cache' / f"{self.WORKDIR.name}-{key}"
+
     @cached_property
     def AVAILABLE_STYLES(self):
         path = self.PATHS.defaults / 'styles'
@@ -30,11 +42,14 @@ class Config:
     def PATHS(self):
         topofile = self.parser['FILENAMES'].getstring('topography')
         chlogfile = self.parser['FILENAMES'].getstring('changelog')
+        storefile = self.parser['FILENAMES'].getstring('store')
         paths = self.parser['PATHS']
         PATHS = {k:paths.getabspath(k) for k in paths}
         PATHS['defaults'] = self.MODULEDIR / 'templates'
         PATHS['topography'] = self.WORKDIR / topofile
         PATHS['changelog'] = self.WORKDIR / chlogfile
+        PATHS['store'] = self.CACHEDIR / storefile
+        PATHS.setdefault('pdef', self.MODULEDIR / 'tooling' / 'ooa')
         return SimpleNamespace(**PATHS)
 
     @property
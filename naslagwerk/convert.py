@@ -1,9 +1,19 @@
+import hashlib
 import re
+from functools import cache
+from html import escape, unescape
 from io import StringIO
 
 import pandas as pd
 from markdown import markdown
 
+from naslagwerk import procesdef
+from naslagwerk.htmltable import render_table
+from naslagwerk.source import read_columnar, render_cache
+from naslagwerk.utils import is_true
+
+
+LAZY_MIN_SIZE = 1000
 
 EXTENSIONS = [
     'abbr',
@@ -19,10 +29,18 @@ EXTENSIONS = [
 
 
 class Converter:
-    def __init__(self, environment, context, config):
+    def __init__(self, environment, context, config, files=None, postprocess=None):
         self.environment = environment
         self.context = context
         self.config = config
+        # extra output files (href -> text) written next to the page
+        self.files = files if files is not None else {}
+        # html written to separate files gets the postprocessing of the page
+        self.postprocess = postprocess or (lambda html: html)
+
+    @property
+    def cache(self):
+        return render_cache(self.config.PATHS.store.with_suffix('.tables'))
 
     def template(self, template):
         """
@@ -45,11 +63,18 @@ class Converter:
             kwargs=kwargs
         )
 
-    def collapsible(self, text):
+    def collapsible(self, text, lazy=None):
         """
         Split section into subsections and render these as collapsibles.
+        With ``lazy`` (true or minimum size in characters) the bodies of long
+        hidden subsections are written as html fragments that are fetched when
+        opened; the page only contains their plain text.
         """
         template = self.environment.get_template('snippets/collapsible.jinja')
+        if lazy is not None and lazy.strip().isdigit():
+            lazy = int(lazy) or None
+        else:
+            lazy = LAZY_MIN_SIZE if is_true(lazy) else None
         collapsibles = []
         regex = re.compile('^### ', flags=re.M)
         items = [i.split('\n', 1) for i in regex.split(text)[1:]]
@@ -58,10 +83,22 @@ class Converter:
             if ':' in label:
                 label, hide = label.split(':')
             hide = False if hide not in ['hide'] else True
+            content = markdown(content, extensions=EXTENSIONS)
+            src = None
+            if hide and lazy is not None and len(content) >= lazy:
+                # links in the fragment are relative to the page, so the hash
+                # differs per nestedness
+                fragment = self.postprocess(content)
+                key = f"{self.context['nestedness']}\n{fragment}"
+                src = f"fragments/{hashlib.sha1(key.encode('utf8')).hexdigest()[:16]}.html"
+                self.files[src] = fragment
+                content = escape(to_text(content))
             collapsible = template.render(
-                content=markdown(content, extensions=EXTENSIONS),
+                content=content,
                 label=label,
                 hide=hide,
+                src=src,
+                nestedness=self.context['nestedness'],
             )
             collapsibles.append(collapsible)
         return '\n'.join(collapsibles)
@@ -79,6 +116,17 @@ class Converter:
         path = self.config.PATHS.content / 'raw' / filename
         return path.read_text(encoding='utf8')
 
+    def pdef(self, text, proces, onderdeel='processtappen'):
+        """
+        Render procesdefinitie (processtappen of autov) of OOA ``proces``.
+        """
+        return procesdef.render(
+            proces,
+            onderdeel,
+            self.config.PATHS.pdef,
+            self.config.PATHS.store.with_suffix('.pdef'),
+        )
+
     def image(self, image, **kwargs):
         """
         Render image that zooms when clicked.
@@ -123,23 +171,46 @@ class Converter:
         ).set_index('key')['value'].apply(to_markdown)
         return template.render(content=content)
 
-    def table(self, text, **kwargs):
+    def table(self, text, source=None, columns=None, filter=None, virtual=None, **kwargs):
         """
-        Render basic table from csv.
+        Render basic table from csv or, with ``source``, from a parquet/feather
+        file in the content folder. For a source only ``columns`` (separated
+        by ``;``) are read and rows are selected with query ``filter``; the
+        html is cached by the hash of the file. With ``virtual=true`` the data
+        is written to a json file and the browser only renders visible rows.
         """
-        buffer = StringIO(text)
-        df = pd.read_csv(
-            buffer,
-            skipinitialspace=True,
-            quotechar="'",
-            header=0,
-        )
-        with pd.option_context('display.max_colwidth', -1):
-            html = df.to_html(
-                index=False,
-                na_rep='',
-                escape=False
+        if source is not None:
+            path = self.config.PATHS.content / source
+            if columns is not None:
+                columns = [col.strip() for col in columns.split(';') if col.strip()]
+            key = self.cache.key(path, columns, filter)
+            load = lambda: read_columnar(path, columns, filter)
+        else:
+            key = hashlib.sha1(text.encode('utf8')).hexdigest()
+            load = lambda: pd.read_csv(
+                StringIO(text),
+                skipinitialspace=True,
+                quotechar="'",
+                header=0,
             )
+        virtual = is_true(virtual)
+        # inline csv may contain html; a virtual table shows its values as
+        # text, in the browser (textContent) and in the fallback page alike
+        render = lambda df: render_table(
+            df,
+            index=False,
+            na_rep='',
+            escape=source is not None or virtual,
+            classes='dataframe',
+            border=1,
+        )
+
+        if virtual:
+            html = self.virtual_table(cache(load), key, render)
+        elif source is not None:
+            html = self.cache.get(key, lambda: render(load()))
+        else:
+            html = render(load())
         return self.container(
             html,
             process=False,
@@ -147,6 +218,28 @@ class Converter:
             **kwargs
         )
 
+    def virtual_table(self, load, key, render):
+        """
+        Write table data as json (and as static html page for browsers without
+        javascript) to the data folder; return html that renders the visible
+        rows client-side.
+        """
+        to_json = lambda df: df.to_json(
+            orient='split', index=False, date_format='iso', force_ascii=False)
+        data = self.cache.get(key, lambda: to_json(load()), suffix='.json')
+        table = self.cache.get(key, lambda: render(load()))
+
+        name = f"data/{key[:16]}"
+        page = self.environment.get_template('snippets/tablepage.jinja')
+        self.files[f"{name}.json"] = data
+        self.files[f"{name}.html"] = page.render(content=table, nestedness='../')
+        template = self.environment.get_template('snippets/virtualtable.jinja')
+        return template.render(
+            src=f"{name}.json",
+            fallback=f"{name}.html",
+            **self.context
+        )
+
     def flextable(self, text):
         """
         Render flextable from csv.
@@ -209,3 +302,11 @@ def to_markdown(text):
     if not any(symbol in char for char in text for symbol in symbols):
         return text
     return markdown(text, extensions=EXTENSIONS).replace('\n', '')
+
+
+def to_text(html):
+    """
+    Plain text of html (tags removed, whitespace collapsed).
+    """
+    text = unescape(re.sub(r'<[^>]+>', ' ', html))
+    return ' '.join(text.split())
@@ -0,0 +1,91 @@
+import json
+import subprocess
+from pathlib import Path
+
+
+def git(*args, cwd):
+    """
+    Run git; if git cannot be started (not installed) the result has a
+    non-zero returncode like any failed git command.
+    """
+    command = ['git', '-c', 'core.quotePath=false', *args]
+    try:
+        return subprocess.run(
+            command,
+            cwd=cwd,
+            capture_output=True,
+            text=True,
+            encoding='utf8',
+        )
+    except OSError as e:
+        return subprocess.CompletedProcess(command, 127, '', str(e))
+
+
+def git_dates(root, cache=None):
+    """
+    Dict of path (str) -> (created, modified) timestamps for all files under
+    ``root`` according to git history. The history is walked once per build;
+    results are cached per HEAD in json file ``cache`` and on the next build
+    only the new commits are walked. Renames are followed, so a file moved
+    by build_topography keeps its created date; a pure rename does not count
+    as modification. Returns empty dict outside a repository or without git.
+    """
+    root = Path(root)
+    toplevel = git('rev-parse', '--show-toplevel', cwd=root)
+    head = git('rev-parse', 'HEAD', cwd=root)
+    if toplevel.returncode or head.returncode:
+        return {}
+    toplevel, head = Path(toplevel.stdout.strip()), head.stdout.strip()
+
+    cached = {}
+    if cache is not None and Path(cache).exists():
+        cached = json.loads(Path(cache).read_text(encoding='utf8'))
+    if cached.get('head') == head:
+        return {k:tuple(v) for k,v in cached['dates'].items()}
+
+    revisions, dates = 'HEAD', {}
+    if cached:
+        is_ancestor = git('merge-base', '--is-ancestor', cached['head'], 'HEAD', cwd=root)
+        if not is_ancestor.returncode:
+            revisions = f"{cached['head']}..HEAD"
+            dates = {k:tuple(v) for k,v in cached['dates'].items()}
+
+    log = git(
+        'log', '--format=%x00%ct', '--name-status', '-M',
+        revisions, '--', '.', cwd=root)
+    if log.returncode:
+        return {}
+
+    # walking from new to old: names[old] is the current name of a file that
+    # was renamed later on
+    names, found = {}, {}
+    for commit in log.stdout.split('\0')[1:]:
+        timestamp, *lines = commit.strip('\n').split('\n')
+        timestamp = int(timestamp)
+        for line in filter(None, lines):
+            status, *files = line.split('\t')
+            path = names.get(files[-1], files[-1])
+            if status.startswith('R'):
+                names[files[0]] = path
+            created, modified = found.get(path, (timestamp, None))
+            created = min(created, timestamp)
+            if not status == 'R100':
+                modified = max(modified or timestamp, timestamp)
+            found[path] = (created, modified)
+
+    # cached dates are older than the new commits and use the old names
+    for path in list(dates):
+        file = Path(path).relative_to(toplevel).as_posix()
+        if file in names:
+            dates[str(toplevel / names[file])] = dates.pop(path)
+    for file, (created, modified) in found.items():
+        path = str(toplevel / file)
+        if path in dates:
+            created, old_modified = dates[path]
+            modified = max(old_modified, modified or old_modified)
+        dates[path] = (created, modified or created)
+
+    if cache is not None:
+        dump = json.dumps({'head': head, 'dates': dates})
+        Path(cache).write_text(dump, encoding='utf8')
+    return dates
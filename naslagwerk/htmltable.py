@@ -0,0 +1,93 @@
+from html import escape as escape_html
+
+import numpy as np
+import pandas as pd
+
+
+def spans(index):
+    """
+    Per level of ``index`` the span of each label: the run length where a run
+    starts and 0 for labels merged into the run above. As in pandas the last
+    level is never merged; a run breaks when any higher level changes.
+    """
+    if not isinstance(index, pd.MultiIndex):
+        return [np.ones(len(index), dtype=int)]
+    n = len(index)
+    nieuw = np.zeros(n, dtype=bool)
+    nieuw[:1] = True
+    result = []
+    for level, codes in enumerate(index.codes):
+        if level == index.nlevels - 1:
+            result.append(np.ones(n, dtype=int))
+            break
+        nieuw[1:] |= codes[1:] != codes[:-1]
+        starts = np.flatnonzero(nieuw)
+        span = np.zeros(n, dtype=int)
+        span[starts] = np.diff(np.append(starts, n))
+        result.append(span)
+    return result
+
+
+def render_table(df, index=True, escape=True, na_rep='', classes=None, border=None):
+    """
+    Render ``df`` as html table in a single pass. MultiIndex labels are merged
+    with row/colspan; header and index cells only get the shared classes
+    ``level<n>`` (plus ``index_name``), data cells get no classes at all.
+    With ``border`` the table gets a border attribute like ``to_html``.
+    """
+    fmt = escape_html if escape else str
+    label = lambda value: na_rep if pd.isna(value) else fmt(str(value))
+
+    def labels(values):
+        values = pd.Series(values, dtype=object)
+        formatted = [fmt(str(value)) for value in values]
+        return np.where(values.isna(), na_rep, formatted).tolist()
+
+    attr = lambda name, n: f' {name}="{n}"' if n > 1 else ''
+    nindex = df.index.nlevels if index else 0
+    names = list(df.index.names) if index else []
+
+    attrs = ''.join([
+        f' border="{border}"' if border is not None else '',
+        f' class="{classes}"' if classes else '',
+    ])
+    html = [f'<table{attrs}>', '<thead>']
+    for level, span in enumerate(spans(df.columns)):
+        values = df.columns.get_level_values(level)
+        row = ['<th class="blank">&nbsp;</th>'] * (nindex - 1)
+        if nindex:
+            name = df.columns.names[level]
+            row.append(f'<th class="index_name">{label(name) if name else "&nbsp;"}</th>')
+        row += [
+            f'<th class="level{level}"{attr("colspan", n)}>{label(value)}</th>'
+            for value, n in zip(values, span) if n
+        ]
+        html.append(f"<tr>{''.join(row)}</tr>")
+    if any(name is not None for name in names):
+        row = [
+            f'<th class="index_name level{level}">{label(name)}</th>'
+            for level, name in enumerate(names)
+        ]
+        row += ['<th class="blank">&nbsp;</th>'] * df.shape[1]
+        html.append(f"<tr>{''.join(row)}</tr>")
+    html.append('</thead>')
+
+    headers = []
+    if index:
+        headers = [
+            (level, labels(df.index.get_level_values(level)), span.tolist())
+            for level, span in enumerate(spans(df.index))
+        ]
+    columns = [labels(df.iloc[:, i]) for i in range(df.shape[1])]
+
+    html.append('<tbody>')
+    for i, cells in enumerate(zip(*columns) if columns else [()] * len(df)):
+        row = [
+            f'<th class="level{level}"{attr("rowspan", span[i])}>{values[i]}</th>'
+            for level, values, span in headers if span[i]
+        ]
+        row += [f'<td>{cell}</td>' for cell in cells]
+        html.append(f"<tr>{''.join(row)}</tr>")
+    html.append('</tbody>')
+    html.append('</table>')
+    return '\n'.join(html)
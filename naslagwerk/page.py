@@ -1,7 +1,10 @@
+import os
 import re
+import threading
 import warnings
 from datetime import datetime
 from functools import cached_property, reduce
+from types import SimpleNamespace
 
 from markdown import Markdown
 from markdown.extensions.toc import TocExtension
@@ -9,6 +12,65 @@ from markdown.extensions.toc import TocExtension
 from naslagwerk.convert import Converter, EXTENSIONS
 
 
+# elements left alone by Page.postprocess
+RAW_ELEMENTS = re.compile(
+    r"<(script|style|pre|code)\b.*?</\1>",
+    re.DOTALL | re.IGNORECASE,
+)
+
+def parse_sections(text):
+    """
+    Split markdown text into sections; converter blocks (starting with ``|``)
+    become tuples of (func_name, body, (args, kwargs)).
+    """
+    sections = list()
+    items = re.split(r"_{5,}\n", text or '')
+    for item in items:
+        if len(item) == 0:
+            continue
+        elif item[0] == '|':
+            func_name, _, body = item[1:].partition('\n')
+            if ':' in func_name:
+                func_name, args = func_name.split(':', maxsplit=1)
+            else:
+                func_name, args = func_name, ''
+            func_name = func_name.strip().lower()
+            item = (func_name, body, get_args(args))
+        sections.append(item)
+    return sections
+
+
+def get_args(items):
+    args, kwargs = [], {}
+    for item in items.split(','):
+        if '=' in item:
+            key, val = item.split('=', maxsplit=1)
+            kwargs[key.strip()] = unquote(val.strip())
+        else:
+            args.append(item) if item else None
+    return args, kwargs
+
+
+def write_shared(path, text):
+    """
+    Write file that other pages may write at the same time (e.g. table data
+    used on several pages) via temporary file and atomic replace.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+    tmp.write_text(text, encoding='utf-8')
+    os.replace(tmp, path)
+
+
+def unquote(value):
+    """
+    Strip one pair of matching quotes, e.g. "soort == 'T'" -> soort == 'T'.
+    """
+    if len(value) > 1 and value[0] == value[-1] and value[0] in '\'"':
+        return value[1:-1]
+    return value.strip('\'"')
+
+
 class Page:
     def __init__(
         self,
@@ -20,6 +82,7 @@ class Page:
         text=None,
         ctime=None,
         mtime=None,
+        parsed=None,
     ):
         self.config = config
         self.topography = topography
@@ -29,7 +92,9 @@ class Page:
         self.text = text
         self.ctime = ctime
         self.mtime = mtime
+        self.parsed = parsed
         self.styles = []
+        self.files = {}
 
     @property
     def content(self):
@@ -39,7 +104,13 @@ class Page:
         )
         extensions = EXTENSIONS + [toc]
         markdown = Markdown(extensions=extensions)
-        converter = Converter(self.environment, self.context, self.config)
+        converter = Converter(
+            self.environment,
+            self.context,
+            self.config,
+            self.files,
+            postprocess=self.postprocess,
+        )
 
         def render(item):
             if isinstance(item, tuple):
@@ -72,7 +143,10 @@ class Page:
                 'group': 'this_group',
                 'page': 'this_page',
             }
-            page_data = self.topography.data.loc[self.page_id].rename(to_rename)
+            record = self.topography.record(self.page_id)
+            page_data = {to_rename.get(k, k):v for k,v in record.items()}
+            page_data['prev_page'] = self.topography.record(record['prev_page_id'])
+            page_data['next_page'] = self.topography.record(record['next_page_id'])
         return {
             **page_data,
             'ctime': self.ctime,
@@ -84,47 +158,38 @@ class Page:
         template = self.environment.get_template(f'page/{self.template}.jinja')
         return template.render(content=self.content, **self.context)
 
-    def write(self, path):
-        html = self.render()
-        path = path / self.context['href']
-        path.parent.mkdir(parents=True, exist_ok=True)
-        path.write_text(html, encoding='utf-8')
+    def write(self, path, html=None):
+        if html is None:
+            html = self.render()
+        target = path / self.context['href']
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(html, encoding='utf-8')
+        for href, text in self.files.items():
+            write_shared(path / href, text)
 
     @cached_property
     def sections(self):
-        sections = list()
-        items = re.split(r"_{5,}\n", self.text or '')
-        for item in items:
-            if len(item) == 0:
-                continue
-            elif item[0] == '|':
-                func_name, body = item[1:].split('\n', 1)
-                if ':' in func_name:
-                    func_name, args = func_name.split(':', maxsplit=1)
-                else:
-                    func_name, args = func_name, ''
-                func_name = func_name.strip().lower()
-                if func_name in self.config.AVAILABLE_STYLES:
-                    self.styles.append(func_name)
-                item = (func_name, body, self.get_args(args))
-            sections.append(item)
-        return sections
-
-    def get_args(self, items):
-        args, kwargs = [], {}
-        for item in items.split(','):
-            if '=' in item:
-                key, val = item.split('=', maxsplit=1)
-                kwargs[key.strip()] = val.strip(' \'"')
-            else:
-                args.append(item) if item else None
-        return args, kwargs
+        if self.parsed is None:
+            self.parsed = parse_sections(self.text)
+        for item in self.parsed:
+            if isinstance(item, tuple) and item[0] in self.config.AVAILABLE_STYLES:
+                self.styles.append(item[0])
+        return self.parsed
 
     def postprocess(self, item):
+        """
+        Run the pp_* methods over ``item``, skipping the content of script,
+        style, pre and code elements.
+        """
         compose = lambda methods: reduce(lambda f,g: lambda x: g(f(x)), methods)
         methods = (getattr(self, i) for i in dir(self) if i.startswith('pp_'))
         pipeline = compose(methods)
-        return pipeline(item)
+        parts, start = [], 0
+        for match in RAW_ELEMENTS.finditer(item):
+            parts += [pipeline(item[start:match.start()]), match.group(0)]
+            start = match.end()
+        parts.append(pipeline(item[start:]))
+        return ''.join(parts)
 
     def pp_arrows(self, item):
         arrows = {
@@ -170,32 +235,50 @@ class Page:
         """
         Instantiate Page from markdown file.
         """
-        ctimestamp = path.stat().st_ctime
-        mtimestamp = path.stat().st_mtime
-        ctime = datetime.fromtimestamp(ctimestamp).strftime('%d-%m-%Y')
-        mtime = datetime.fromtimestamp(mtimestamp).strftime('%d-%m-%Y')
+        stat = path.stat()
         md = path.read_text(encoding=encoding)
         page_id, text = md.split('\n', 1)
-        if page_id not in topography.data.index:
-            print(
+        entry = SimpleNamespace(
+            path=path,
+            page_id=page_id,
+            text=text,
+            ctime=stat.st_ctime,
+            mtime=stat.st_mtime,
+            sections=None,
+        )
+        return cls.from_entry(entry, config, topography, environment)
+
+    @classmethod
+    def from_entry(cls, entry, config, topography, environment):
+        """
+        Instantiate Page from a (stored) entry with path, page_id, text,
+        ctime/mtime timestamps and optionally already parsed sections.
+        """
+        if entry.page_id not in topography:
+            # as warning, so a running progress line is cleared first
+            warnings.warn(
 f"""
 +-----------------------------------------------------------------------------+
                             !! WAARSCHUWING !!
 +-----------------------------------------------------------------------------+
-   - file: "{path.relative_to(config.WORKDIR)}"
-   - id:   <{page_id}>
+   - file: "{entry.path.relative_to(config.WORKDIR)}"
+   - id:   <{entry.page_id}>
 
    Id komt niet voor in topografie
    -> bestand kan niet worden verwerkt
 +-----------------------------------------------------------------------------+
-""")
+""", stacklevel=2)
             return None
+        ctime = datetime.fromtimestamp(entry.ctime).strftime('%d-%m-%Y')
+        mtime = datetime.fromtimestamp(entry.mtime).strftime('%d-%m-%Y')
         return cls(
             config,
             topography,
             environment,
-            page_id=page_id,
-            text=text,
+            page_id=entry.page_id,
+            text=entry.text,
             ctime=ctime,
             mtime=mtime,
+            parsed=entry.sections,
         )
+
@@ -0,0 +1,110 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+
+DONE = object()
+
+
+class Stage:
+    """
+    Pipeline stage that runs ``func`` on every item in its own executor.
+    Results that are None are dropped and not passed to the next stage.
+    """
+    REPORT = " «{name}»{sep} {items} items | {rate:.1f}/s | busy {util:.0%}"
+
+    def __init__(self, name, func, workers=1):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.items = 0
+        self.dropped = 0
+        self.busy = 0.0
+        self.inbox = None
+        self.started = None
+        self.stopped = None
+
+    async def process(self, loop, executor, item):
+        start = perf_counter()
+        result = await loop.run_in_executor(executor, self.func, item)
+        self.busy += perf_counter() - start
+        self.items += 1
+        return result
+
+    @property
+    def elapsed(self):
+        return (self.stopped or perf_counter()) - (self.started or perf_counter())
+
+    @property
+    def queued(self):
+        return self.inbox.qsize() if self.inbox is not None else 0
+
+    @property
+    def throughput(self):
+        return self.items / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def utilisation(self):
+        capacity = self.elapsed * self.workers
+        return self.busy / capacity if capacity else 0.0
+
+    def report(self):
+        return self.REPORT.format(
+            name=self.name,
+            sep=f"{'::': >{16-len(self.name)}}",
+            items=self.items,
+            rate=self.throughput,
+            util=self.utilisation,
+        )
+
+
+async def run_stages(items, stages, maxsize=64):
+    """
+    Feed ``items`` through ``stages`` connected by bounded queues, so that
+    the stages run concurrently and each only buffers ``maxsize`` items.
+    """
+    loop = asyncio.get_running_loop()
+    queues = [asyncio.Queue(maxsize) for _ in stages]
+    executors = [ThreadPoolExecutor(stage.workers) for stage in stages]
+
+    async def feed():
+        for item in items:
+            await queues[0].put(item)
+        for _ in range(stages[0].workers):
+            await queues[0].put(DONE)
+
+    async def work(stage, executor, inbox, outbox):
+        while (item := await inbox.get()) is not DONE:
+            result = await stage.process(loop, executor, item)
+            if result is None:
+                stage.dropped += 1
+            elif outbox is not None:
+                await outbox.put(result)
+
+    async def run(i, stage):
+        inbox = queues[i]
+        outbox = queues[i+1] if i+1 < len(stages) else None
+        stage.inbox = inbox
+        stage.started = perf_counter()
+        await asyncio.gather(*(
+            work(stage, executors[i], inbox, outbox)
+            for _ in range(stage.workers)
+        ))
+        stage.stopped = perf_counter()
+        if outbox is not None:
+            for _ in range(stages[i+1].workers):
+                await outbox.put(DONE)
+
+    try:
+        await asyncio.gather(feed(), *(run(i, s) for i, s in enumerate(stages)))
+    finally:
+        for executor in executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+    return stages
+
+
+def pipeline(items, stages, maxsize=64):
+    """
+    Run ``stages`` over ``items`` in an asyncio event loop.
+    """
+    return asyncio.run(run_stages(items, stages, maxsize=maxsize))
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import threading
+from pathlib import Path
+
+from naslagwerk.page import write_shared
+from naslagwerk.publish import read_manifest
+
+
+MANIFEST = 'precache.json'
+WORKER = 'sw.js'
+
+
+class Precache:
+    """
+    Thread-safe collection of content hashes (href -> sha1) of the files
+    written to the output folder, for the service worker that caches the
+    site in the browser.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hashes = {}
+
+    def add(self, href, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        digest = hashlib.sha1(data).hexdigest()
+        with self.lock:
+            self.hashes[href] = digest
+
+    def add_file(self, href, path):
+        self.add(href, Path(path).read_bytes())
+
+    def merge(self, output):
+        """
+        Hashes collected in this build on top of the deploy manifest of the
+        previous build in ``output``, for files that still exist; a partial
+        build then keeps the files it did not write.
+        """
+        previous = {
+            href: digest for href, digest in read_manifest(output).items()
+            if href not in [MANIFEST, WORKER] and (Path(output) / href).is_file()
+        }
+        return dict(sorted({**previous, **self.hashes}.items()))
+
+
+def render_worker(environment, hashes):
+    """
+    Service worker with the manifest ``hashes`` inlined; its version changes
+    with any hash so browsers install the new worker after each change.
+    """
+    files = json.dumps(hashes, sort_keys=True)
+    version = hashlib.sha1(files.encode('utf8')).hexdigest()[:16]
+    template = environment.get_template('page/serviceworker.jinja')
+    return template.render(version=version, files=files)
+
+
+def write_precache(
+    precache, environment, output=None, archive=None, worker=True, full=True, live=None):
+    """
+    Write manifest and service worker to the root of ``output`` or (if
+    given) into ``archive``; without ``worker`` (offline switched off)
+    nothing is written. Returns the hashes of all files of the site,
+    including the manifest and service worker themselves: the files
+    written in this build or, after a partial build (not ``full``), merged
+    with the previous build in ``live`` (the published output when
+    building in a staging directory; default ``output``).
+    """
+    if full or archive is not None:
+        hashes = dict(sorted(precache.hashes.items()))
+    else:
+        hashes = precache.merge(live or output)
+    if not worker:
+        return hashes
+    files = {
+        MANIFEST: json.dumps(hashes),
+        WORKER: render_worker(environment, hashes),
+    }
+    for href, text in files.items():
+        if archive is not None:
+            archive.write_text(href, text)
+        else:
+            write_shared(Path(output) / href, text)
+    return {
+        **hashes,
+        **{href: hashlib.sha1(text.encode('utf-8')).hexdigest() for href, text in files.items()},
+    }
@@ -0,0 +1,87 @@
+import hashlib
+import sys
+from functools import lru_cache
+from pathlib import Path
+from threading import Lock
+
+from naslagwerk import htmltable
+
+
+ONDERDELEN = ['processtappen', 'autov']
+LOCK = Lock()
+
+
+@lru_cache(maxsize=None)
+def tooling(path):
+    """
+    Import the pdef tooling (tooling/ooa) from ``path``. The module state
+    is left alone: the extract folder is passed to each load, so sites with
+    another [PATHS] pdef read their own extracts.
+    """
+    if str(path) not in sys.path:
+        sys.path.append(str(path))
+    import pdef.dataset
+    import pdef.naslag
+    import pdef.tabel
+    return pdef
+
+
+def bronnen(path):
+    """
+    Source files of the tooling in ``path`` that shape the html: the pdef
+    modules, the templates and the table renderer of the naslagwerk.
+    """
+    path = Path(path)
+    return [
+        *sorted((path / 'pdef').glob('*.py')),
+        *sorted(p for p in (path / 'templates').glob('*') if p.is_file()),
+        Path(htmltable.__file__),
+    ]
+
+
+def fingerprint(files):
+    """
+    Hash of name, size and mtime of ``files``.
+    """
+    digest = hashlib.sha1()
+    for path in files:
+        stat = path.stat()
+        digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode('utf8'))
+    return digest.hexdigest()
+
+
+def maak_html(pdef, proces, onderdeel, root):
+    if onderdeel == 'processtappen':
+        return pdef.naslag.processtappen(pdef.dataset.load_pdef_datasets(proces, root))
+    datasets = pdef.dataset.load_autov_datasets(proces, root)
+    table = pdef.tabel.maak_autov(datasets)
+    return pdef.naslag.autov(table, render=htmltable.render_table)
+
+
+def render(proces, onderdeel, path, cache):
+    """
+    Html of procesdefinitie ``onderdeel`` of OOA ``proces``. The html is
+    cached in folder ``cache`` per fingerprint of the extract files and the
+    tooling sources, so it is only regenerated when one of them has changed.
+    """
+    if onderdeel not in ONDERDELEN:
+        raise ValueError(f"onbekend onderdeel: {onderdeel} (kies uit {ONDERDELEN})")
+    pdef = tooling(path)
+    with LOCK:
+        extract = pdef.dataset.bronbestanden(proces, path)
+        if not extract:
+            raise FileNotFoundError(
+                f"geen extractbestanden voor proces {proces} in {path}")
+        key = fingerprint([*extract, *bronnen(path)])
+
+        stem = f"{proces.lower()}.{onderdeel}"
+        cached = cache / f"{stem}.{key[:16]}.html"
+        if cached.exists():
+            return cached.read_text(encoding='utf8')
+
+        html = maak_html(pdef, proces, onderdeel, path)
+        cache.mkdir(parents=True, exist_ok=True)
+        for stale in cache.glob(f"{stem}.*.html"):
+            stale.unlink()
+        cached.write_text(html, encoding='utf8')
+    return html
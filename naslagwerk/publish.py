@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+
+MANIFEST = '.published.json'
+DEPLOY_MANIFEST = 'manifest.json'
+
+
+def staging_dir(output):
+    """
+    Default local staging directory for ``output`` in the temp folder.
+    """
+    output = Path(output)
+    key = hashlib.sha1(str(output).encode('utf8')).hexdigest()[:8]
+    return Path(tempfile.gettempdir()) / 'naslagwerk' / f"{output.parent.name}-{key}"
+
+
+def hash_files(root):
+    """
+    Dict of relative posix path -> sha1 for all files under ``root``.
+    """
+    return {
+        path.relative_to(root).as_posix():
+            hashlib.sha1(path.read_bytes()).hexdigest()
+        for path in root.rglob('*')
+        if path.is_file() and not path.name == MANIFEST
+    }
+
+
+def read_manifest(path):
+    """
+    Deploy manifest (relative posix path -> sha1) from json file ``path`` or
+    from the output folder ``path``; empty if there is none (first deploy).
+    """
+    path = Path(path)
+    if path.is_dir():
+        path = path / DEPLOY_MANIFEST
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding='utf8'))
+
+
+def write_manifest(files, output=None, archive=None):
+    """
+    Write deploy manifest of ``files`` (relative posix path -> sha1) to the
+    root of ``output`` or (if given) into ``archive``.
+    """
+    text = json.dumps(dict(sorted(files.items())), indent=0)
+    if archive is not None:
+        archive.write_text(DEPLOY_MANIFEST, text)
+    else:
+        (Path(output) / DEPLOY_MANIFEST).write_text(text, encoding='utf8')
+
+
+def compare(old, new):
+    """
+    Added, changed and removed paths going from manifest ``old`` to ``new``.
+    """
+    return SimpleNamespace(
+        added=sorted(rel for rel in new if rel not in old),
+        changed=sorted(rel for rel in new if rel in old and not old[rel] == new[rel]),
+        removed=sorted(rel for rel in old if rel not in new),
+    )
+
+
+def publish(staging, output, map=map, keep=2, prune=True):
+    """
+    Publish ``staging`` to ``output`` copying only files that changed since
+    the previous publish (according to the manifest kept in ``output``).
+
+    If ``output`` is a symlink (or does not exist yet and symlinks are
+    supported) a new versioned directory is filled and the symlink swapped
+    atomically; unchanged files are hard linked from the current version.
+    Otherwise changed files are replaced in place one by one.
+
+    Files that are live but not in ``staging`` are only removed with
+    ``prune`` (a full build); after a partial build (``--only``, ``--skip``
+    or a wiped staging directory) they are kept.
+    """
+    staging, output = Path(staging), Path(output)
+    manifest = output / MANIFEST
+    previous = {}
+    if manifest.exists():
+        previous = json.loads(manifest.read_text(encoding='utf8'))
+    current = hash_files(staging)
+    delta = compare(previous, current)
+    changed = delta.added + delta.changed
+    removed = delta.removed if prune else []
+    kept = [] if prune else delta.removed
+    current = {**{rel: previous[rel] for rel in kept}, **current}
+
+    if output.is_symlink() or not output.exists():
+        mode = publish_versioned(staging, output, current, changed, map, keep, kept)
+    else:
+        mode = publish_in_place(staging, output, current, changed, removed, map)
+    return SimpleNamespace(
+        mode=mode, changed=len(changed), removed=len(removed), kept=len(kept))
+
+
+def publish_in_place(staging, output, current, changed, removed, map=map):
+    for folder in {(output / rel).parent for rel in changed}:
+        folder.mkdir(parents=True, exist_ok=True)
+
+    def place(rel):
+        dst = output / rel
+        tmp = dst.with_name(f"{dst.name}.tmp")
+        shutil.copyfile(staging / rel, tmp)
+        os.replace(tmp, dst)
+
+    list(map(place, changed))
+    for rel in removed:
+        (output / rel).unlink(missing_ok=True)
+    (output / MANIFEST).write_text(json.dumps(current), encoding='utf8')
+    return 'in-place'
+
+
+def publish_versioned(staging, output, current, changed, map=map, keep=2, kept=()):
+    previous = output.resolve() if output.is_symlink() else None
+    version = output.with_name(f"{output.name}.v{datetime.now():%Y%m%d%H%M%S%f}")
+    for folder in {(version / rel).parent for rel in current}:
+        folder.mkdir(parents=True, exist_ok=True)
+    changed, kept = set(changed), set(kept)
+
+    def place(rel):
+        if previous is not None and rel not in changed:
+            try:
+                os.link(previous / rel, version / rel)
+                return
+            except OSError:
+                pass
+        shutil.copyfile((previous if rel in kept else staging) / rel, version / rel)
+
+    list(map(place, current))
+    (version / MANIFEST).write_text(json.dumps(current), encoding='utf8')
+
+    link = output.with_name(f"{output.name}.tmp")
+    link.unlink(missing_ok=True)
+    try:
+        link.symlink_to(version, target_is_directory=True)
+    except OSError:
+        # no symlinks on this filesystem: fresh output becomes plain folder
+        version.rename(output)
+        return 'in-place'
+    os.replace(link, output)
+
+    versions = sorted(
+        path for path in output.parent.glob(f"{output.name}.v*")
+        if path.is_dir() and not path.is_symlink())
+    for path in versions[:-keep]:
+        shutil.rmtree(path)
+    return 'versioned'
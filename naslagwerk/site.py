@@ -1,14 +1,37 @@
 import json
 from configparser import ConfigParser
+from fnmatch import fnmatch
 from functools import cached_property
 from warnings import warn
 
 import pandas as pd
 import numpy as np
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import BytecodeCache, Environment, FileSystemLoader
 from markdown import Markdown
 from markdown.extensions.toc import TocExtension
 
+from naslagwerk.utils import is_true
+
+
+class MemoryBytecodeCache(BytecodeCache):
+    """
+    In-process bytecode cache, so that environments of several sites built
+    in one run compile the shared default templates only once.
+    """
+    def __init__(self):
+        self.cache = {}
+
+    def load_bytecode(self, bucket):
+        code = self.cache.get(bucket.key)
+        if code is not None:
+            bucket.bytecode_from_string(code)
+
+    def dump_bytecode(self, bucket):
+        self.cache[bucket.key] = bucket.bytecode_to_string()
+
+
+BYTECODE_CACHE = MemoryBytecodeCache()
+
 
 def make_environment(config, topography, changelog=None):
     searchpath=[config.PATHS.templates, config.PATHS.defaults]
@@ -18,13 +41,15 @@ def make_environment(config, topography, changelog=None):
         trim_blocks=True,
         lstrip_blocks=True,
         auto_reload=False,
+        bytecode_cache=BYTECODE_CACHE,
     )
     environment.globals = {
         'props': config.PROPERTIES,
-        'topo': topography.data,
+        'topo': topography.frame,
         'hrefs_sections': topography.hrefs_sections,
         'sitemap': topography.sitemap,
         'changelog': changelog if changelog is not None else {},
+        'is_true': is_true,
         'watermark': """
     <!-- This site was built with the site builder at https://github.com/uu-asc/naslagwerk licensed under the GNU General Public License v3.0. -->
     """
@@ -35,9 +60,31 @@ def make_environment(config, topography, changelog=None):
 class Topography:
     def __init__(self, data):
         self.data = data
+        self.frame = data
         self.page_ids = self.data.index.values
         self.sections = self.data.section.unique().tolist()
 
+    def __contains__(self, page_id):
+        return page_id in self.data.index
+
+    def record(self, page_id):
+        return self.data.loc[page_id]
+
+    def dependants(self, page_ids):
+        """
+        Set of ``page_ids`` plus the pages that render something of them:
+        their prev/next neighbours and the pages sharing their section aside.
+        """
+        selected = self.data.index.isin(list(page_ids))
+        sections = self.data.loc[selected, 'section']
+        neighbours = self.data.loc[selected, ['prev_page_id', 'next_page_id']]
+        mask = (
+            selected
+            | self.data.section.isin(sections)
+            | self.data.index.isin(neighbours.values.ravel())
+        )
+        return set(self.data.index[mask])
+
     @cached_property
     def hrefs_sections(self):
         """
@@ -87,6 +134,28 @@ class Topography:
         return cls(data)
 
 
+def select_page_ids(selectors, topography, entries, root):
+    """
+    Resolve selectors, (key, values) pairs with key one of 'section',
+    'chapter', 'page_id' or 'path' (glob relative to ``root``), into the set
+    of selected page ids plus the pages depending on them.
+    """
+    data = topography.data
+    selected = set()
+    for key, values in selectors:
+        if key == 'path':
+            selected.update(
+                entry.page_id for entry in entries
+                if any(
+                    fnmatch(entry.path.relative_to(root).as_posix(), pattern)
+                    for pattern in values))
+        elif key == 'page_id':
+            selected.update(values)
+        else:
+            selected.update(data.index[data[key].isin(values)])
+    return topography.dependants(selected)
+
+
 def nested_dict_from_data(data):
     """
     Create nested dict from dataframe with multiindex.
@@ -0,0 +1,167 @@
+import hashlib
+import json
+from collections.abc import Mapping
+from dataclasses import dataclass, fields
+from functools import cached_property
+from pathlib import PurePath
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+
+class Frozen(Mapping):
+    """
+    Immutable, picklable mapping that also allows attribute access.
+    """
+    __slots__ = ('_data',)
+
+    def __init__(self, data=(), **kwargs):
+        object.__setattr__(self, '_data', dict(data, **kwargs))
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __getattr__(self, name):
+        try:
+            return self._data[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return (type(self), (self._data,))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self._data!r})"
+
+
+@dataclass(frozen=True, eq=False)
+class BuildContext:
+    """
+    Frozen snapshot of config, topography and changelog. Built once per build
+    and cheap to pickle, so it can be shipped to worker processes. Quacks like
+    both ``Config`` and ``Topography`` where ``Page`` and ``make_environment``
+    are concerned.
+    """
+    properties: Frozen
+    paths: Frozen
+    workdir: PurePath
+    styles: tuple
+    pages: Frozen
+    crossrefs: Frozen
+    hrefs_sections: Frozen
+    sitemap: Frozen
+    changelog: Frozen
+
+    @classmethod
+    def from_build(cls, config, topography, changelog=None):
+        return cls(
+            properties=freeze(config.PROPERTIES),
+            paths=freeze(config.PATHS),
+            workdir=config.WORKDIR,
+            styles=freeze(config.AVAILABLE_STYLES),
+            pages=freeze(topography.data.to_dict('index')),
+            crossrefs=freeze(topography.crossrefs.to_dict()),
+            hrefs_sections=freeze(topography.hrefs_sections.to_dict()),
+            sitemap=freeze(topography.sitemap),
+            changelog=freeze(changelog or {}),
+        )
+
+    @cached_property
+    def fingerprint(self):
+        """
+        Stable hash of the snapshot contents for use as a cache key.
+        """
+        state = {field.name:getattr(self, field.name) for field in fields(self)}
+        dump = json.dumps(thaw(state), sort_keys=True, default=str)
+        return hashlib.sha1(dump.encode('utf8')).hexdigest()
+
+    def __eq__(self, other):
+        if not isinstance(other, BuildContext):
+            return NotImplemented
+        return self.fingerprint == other.fingerprint
+
+    def __hash__(self):
+        return hash(self.fingerprint)
+
+    # Config interface
+    @property
+    def PROPERTIES(self):
+        return self.properties
+
+    @property
+    def PATHS(self):
+        return self.paths
+
+    @property
+    def WORKDIR(self):
+        return self.workdir
+
+    @property
+    def AVAILABLE_STYLES(self):
+        return self.styles
+
+    # Topography interface
+    @property
+    def data(self):
+        return self.pages
+
+    @property
+    def page_ids(self):
+        return tuple(self.pages)
+
+    @cached_property
+    def frame(self):
+        """
+        Page records as DataFrame (None back to NaN), as ``topo`` in the
+        templates used to be, so ``topo.loc``/``topo.query`` keep working.
+        """
+        frame = pd.DataFrame.from_dict(thaw(self.pages), orient='index')
+        frame.index.name = 'page_id'
+        return frame.fillna(np.nan)
+
+    def record(self, page_id):
+        return self.pages[page_id]
+
+    def __contains__(self, page_id):
+        return page_id in self.pages
+
+
+def freeze(item):
+    """
+    Recursively convert mappings, namespaces and sequences into immutable
+    builtins; numpy scalars become python scalars and NaN becomes None.
+    """
+    if isinstance(item, SimpleNamespace):
+        item = vars(item)
+    if isinstance(item, Mapping):
+        return Frozen({freeze(k):freeze(v) for k,v in item.items()})
+    if isinstance(item, (list, tuple, np.ndarray)):
+        return tuple(freeze(i) for i in item)
+    if isinstance(item, np.generic):
+        item = item.item()
+    if isinstance(item, float) and not item == item:
+        return None
+    return item
+
+
+def thaw(item):
+    """
+    Convert frozen item into json serializable builtins.
+    """
+    if isinstance(item, Mapping):
+        return {str(k):thaw(v) for k,v in item.items()}
+    if isinstance(item, tuple):
+        return [thaw(i) for i in item]
+    if isinstance(item, PurePath):
+        return item.as_posix()
+    return item
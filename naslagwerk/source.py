@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+
+FORMATS = {
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.feather': 'feather',
+    '.arrow': 'feather',
+}
+
+
+def read_columnar(path, columns=None, filter=None):
+    """
+    Read parquet/feather file ``path`` memory mapped, reading only
+    ``columns`` (and the columns used in ``filter``). ``filter`` is a
+    `DataFrame.query` expression.
+    """
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as parquet
+
+    path = Path(path)
+    format = FORMATS.get(path.suffix.lower())
+    if format is None:
+        raise ValueError(f"onbekend bestandsformaat: {path.name} (kies uit {list(FORMATS)})")
+
+    if format == 'parquet':
+        names = parquet.read_schema(path, memory_map=True).names
+    else:
+        with pa.memory_map(str(path)) as source:
+            names = pa.ipc.open_file(source).schema.names
+    selected = names if columns is None else columns
+    missing = [col for col in selected if col not in names]
+    if missing:
+        raise KeyError(f"kolommen {missing} komen niet voor in {path.name}")
+    needed = list(selected)
+    if filter:
+        needed += [
+            col for col in names
+            if col not in needed and re.search(rf"(?<![\w`]){re.escape(col)}(?!\w)|`{re.escape(col)}`", filter)
+        ]
+
+    if format == 'parquet':
+        table = parquet.read_table(path, columns=needed, memory_map=True)
+    else:
+        table = feather.read_table(path, columns=needed, memory_map=True)
+    df = table.to_pandas()
+    if filter:
+        df = df.query(filter)
+    return df[list(selected)]
+
+
+class HashIndex:
+    """
+    Content hashes of files, remembered per (mtime, size) in json file
+    ``path`` so that unchanged files are not read again on the next build.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.hashes = {}
+        if self.path.exists():
+            self.hashes = json.loads(self.path.read_text(encoding='utf8'))
+
+    def __call__(self, file):
+        file = Path(file)
+        stat = file.stat()
+        key = str(file)
+        with self.lock:
+            known = self.hashes.get(key)
+            if known and known[:2] == [stat.st_mtime_ns, stat.st_size]:
+                return known[2]
+        with open(file, 'rb') as f:
+            digest = hashlib.file_digest(f, 'sha1').hexdigest()
+        with self.lock:
+            self.hashes[key] = [stat.st_mtime_ns, stat.st_size, digest]
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text(json.dumps(self.hashes), encoding='utf8')
+        return digest
+
+
+class RenderCache:
+    """
+    Rendered html (or other text) in folder ``path``, one file per key.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.hashes = HashIndex(self.path / 'hashes.json')
+
+    def key(self, file, *args):
+        """
+        Key from the content hash of ``file`` and the render arguments.
+        """
+        data = json.dumps([self.hashes(file), *args], default=str)
+        return hashlib.sha1(data.encode('utf8')).hexdigest()
+
+    def get(self, key, render, suffix='.html'):
+        path = self.path / f"{key}{suffix}"
+        if path.exists():
+            return path.read_text(encoding='utf8')
+        html = render()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(html, encoding='utf8')
+        os.replace(tmp, path)
+        return html
+
+
+@lru_cache(maxsize=None)
+def render_cache(path):
+    """
+    One shared `RenderCache` per cache folder.
+    """
+    return RenderCache(path)
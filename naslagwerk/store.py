@@ -0,0 +1,179 @@
+import hashlib
+import json
+import sqlite3
+import warnings
+from pathlib import Path
+from types import SimpleNamespace
+
+from naslagwerk.page import parse_sections
+
+
+class PageStore:
+    """
+    Local SQLite store of the .md files in the content folder, kept in the
+    cache folder of the user (see `Config.CACHEDIR`). Per file it keeps the
+    stat info, page_id, content hash, text and parsed sections, so that only
+    new or changed files need to be read on the next refresh.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS pages (
+            path     TEXT PRIMARY KEY,
+            ctime    REAL,
+            mtime    REAL,
+            size     INTEGER,
+            page_id  TEXT,
+            hash     TEXT,
+            text     TEXT,
+            sections TEXT
+        )
+    """
+    COLUMNS = ['path', 'ctime', 'mtime', 'size', 'page_id', 'hash', 'text', 'sections']
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute(self.SCHEMA)
+
+    def refresh(self, content, map=map, parse=True):
+        """
+        Sync store with the .md files in ``content``; only new or changed files
+        (by mtime and size) are read. Pass ``pool.map`` as ``map`` to read them
+        in parallel. With ``parse=False`` only the page_id header of these
+        files is read (all build_topography needs); text and sections follow
+        on the next refresh that parses. Returns the number of added, changed
+        and removed files.
+        """
+        known = {
+            path: (mtime, size, parsed) for path, mtime, size, parsed in
+            self.connection.execute(
+                "SELECT path, mtime, size, sections IS NOT NULL FROM pages")
+        }
+        found = {}
+        for path in content.glob('**/*.md'):
+            stat = path.stat()
+            found[str(path)] = (path, stat)
+
+        def stale(key, stat):
+            mtime, size, parsed = known.get(key, (None, None, False))
+            if not (mtime, size) == (stat.st_mtime, stat.st_size):
+                return True
+            return parse and not parsed
+
+        todo = [(path, stat) for key, (path, stat) in found.items() if stale(key, stat)]
+        removed = [(key,) for key in known if key not in found]
+        if parse:
+            rows = self.parse(list(map(self.read_file, todo)), map)
+        else:
+            rows = list(map(self.read_header, todo))
+
+        with self.connection:
+            self.connection.executemany("DELETE FROM pages WHERE path = ?", removed)
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO pages VALUES ({', '.join('?' * 8)})",
+                rows)
+        return SimpleNamespace(
+            added=sum(1 for path, _ in todo if str(path) not in known),
+            changed=sum(1 for path, _ in todo if str(path) in known),
+            removed=len(removed),
+        )
+
+    def parse(self, rows, map=map):
+        """
+        Fill in the sections of freshly read ``rows``; files whose content
+        hash is already in the store (e.g. renamed or touched files) reuse
+        the stored sections, the others are parsed.
+        """
+        hashes = list({row[5] for row in rows})
+        stored = {}
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i+500]
+            stored.update(self.connection.execute(
+                f"""
+                SELECT hash, sections FROM pages
+                WHERE sections IS NOT NULL AND hash IN ({', '.join('?' * len(chunk))})
+                """, chunk))
+
+        def fill(row):
+            sections = stored.get(row[5])
+            if sections is None:
+                sections = parse_file(row[0], row[6])
+            return (*row[:7], sections)
+
+        return list(map(fill, rows))
+
+    @staticmethod
+    def read_file(item, encoding='utf-8'):
+        path, stat = item
+        md = path.read_text(encoding=encoding)
+        page_id, text = md.split('\n', 1) if '\n' in md else (None, md)
+        return (
+            str(path),
+            stat.st_ctime,
+            stat.st_mtime,
+            stat.st_size,
+            page_id,
+            hashlib.sha1(md.encode(encoding)).hexdigest(),
+            text,
+            None,
+        )
+
+    @staticmethod
+    def read_header(item, encoding='utf-8'):
+        path, stat = item
+        with path.open(encoding=encoding) as f:
+            header = f.readline()
+        page_id = header.rstrip('\r\n') if header.endswith('\n') else None
+        return (str(path), stat.st_ctime, stat.st_mtime, stat.st_size, page_id, None, None, None)
+
+    def page_ids(self):
+        """
+        List of (path, page_id) for all files with a page_id header.
+        """
+        query = "SELECT path, page_id FROM pages WHERE page_id IS NOT NULL"
+        return [(Path(path), pid) for path, pid in self.connection.execute(query)]
+
+    def entries(self):
+        """
+        List of entries for all files with a page_id header; ready for
+        ``Page.from_entry``.
+        """
+        query = f"""
+            SELECT {', '.join(self.COLUMNS)} FROM pages
+            WHERE page_id IS NOT NULL
+        """
+        return [self.to_entry(row) for row in self.connection.execute(query)]
+
+    def to_entry(self, row):
+        entry = SimpleNamespace(**dict(zip(self.COLUMNS, row)))
+        entry.path = Path(entry.path)
+        entry.sections = load_sections(entry.sections)
+        return entry
+
+    def close(self):
+        self.connection.close()
+
+
+def parse_file(path, text):
+    """
+    Parsed sections of ``text`` as json; on a parse error the error is
+    reported with ``path`` and None is returned (the page then parses its
+    text itself when it is built).
+    """
+    try:
+        return json.dumps(parse_sections(text))
+    except Exception as e:
+        warnings.warn(f"fout bij lezen van «{path}»: {e!r}", stacklevel=2)
+        return None
+
+
+def load_sections(dump):
+    """
+    Restore sections from json; converter blocks become tuples again.
+    """
+    if dump is None:
+        return None
+    return [
+        (item[0], item[1], tuple(item[2])) if isinstance(item, list) else item
+        for item in json.loads(dump)
+    ]
@@ -0,0 +1,236 @@
+import json
+import os
+import sys
+import threading
+import warnings
+from contextlib import contextmanager
+from pathlib import Path
+from time import perf_counter
+
+from naslagwerk.utils import Stopwatch
+
+
+class Progress:
+    """
+    Live progress of ``total`` items handled by ``workers`` threads: items
+    done, throughput, queue depth, worker utilisation and ETA. While running
+    a status line is refreshed every ``interval`` seconds, in place on a
+    terminal and as plain line every ``10 * interval`` seconds otherwise
+    (e.g. in CI logs). With pipeline ``stages`` the numbers are taken from
+    the stages; otherwise wrap the work on each item in `track`. Warnings
+    raised while running are written above the status line.
+    """
+    LINE = " {done}/{total} {unit} | {rate:.1f}/s | queue {queued} | busy {busy} | ETA {eta}"
+
+    def __init__(self, total, workers=1, unit='pages', stages=None, interval=0.5, stream=None):
+        self.total = total
+        self.unit = unit
+        self.stages = stages or []
+        self.workers = sum(stage.workers for stage in self.stages) or workers
+        self.stream = stream or sys.stdout
+        self.tty = self.stream.isatty()
+        self.interval = interval if self.tty else 10 * interval
+        self.lock = threading.Lock()
+        self.output = threading.Lock()
+        self.items = 0
+        self.running = 0
+        self.busy = 0.0
+        self.started = None
+        self.stopped = None
+        self.width = 0
+        self.ticker = None
+        self.halt = threading.Event()
+        self.showwarning = None
+
+    @contextmanager
+    def track(self):
+        start = perf_counter()
+        with self.lock:
+            self.running += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.running -= 1
+                self.items += 1
+                self.busy += perf_counter() - start
+
+    @property
+    def elapsed(self):
+        return (self.stopped or perf_counter()) - (self.started or perf_counter())
+
+    @property
+    def done(self):
+        if self.stages:
+            return self.stages[-1].items + sum(stage.dropped for stage in self.stages[:-1])
+        return self.items
+
+    @property
+    def queued(self):
+        if self.stages:
+            return sum(stage.queued for stage in self.stages)
+        return self.total - self.items - self.running
+
+    @property
+    def throughput(self):
+        return self.done / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def utilisation(self):
+        """
+        Share of worker time spent working; per stage for a pipeline.
+        """
+        if self.stages:
+            return {stage.name: stage.utilisation for stage in self.stages}
+        capacity = self.elapsed * self.workers
+        return self.busy / capacity if capacity else 0.0
+
+    @property
+    def eta(self):
+        rate = self.throughput
+        return (self.total - self.done) / rate if rate else None
+
+    def line(self):
+        utilisation = self.utilisation
+        if isinstance(utilisation, dict):
+            busy = ' '.join(f"{name} {value:.0%}" for name, value in utilisation.items())
+        else:
+            busy = f"{utilisation:.0%}"
+        eta = self.eta
+        return self.LINE.format(
+            done=self.done,
+            total=self.total,
+            unit=self.unit,
+            rate=self.throughput,
+            queued=self.queued,
+            busy=busy,
+            eta='?' if eta is None else Stopwatch.format_time(eta),
+        )
+
+    def show(self, end=''):
+        with self.output:
+            self.draw(end)
+
+    def draw(self, end=''):
+        line = self.line()
+        if self.tty:
+            self.stream.write(f"\r{line:<{self.width}}{end}")
+            self.width = len(line)
+        else:
+            self.stream.write(f"{line}\n")
+        self.stream.flush()
+
+    def write(self, text, file=None):
+        """
+        Write ``text`` to ``file`` (default the progress stream); on a
+        terminal the status line is cleared first and drawn again below.
+        """
+        file = file or self.stream
+        with self.output:
+            if self.tty and self.width:
+                self.stream.write(f"\r{'':<{self.width}}\r")
+                self.stream.flush()
+            file.write(text if text.endswith('\n') else f"{text}\n")
+            file.flush()
+            if self.tty and self.width:
+                self.draw()
+
+    def warn(self, message, category, filename, lineno, file=None, line=None):
+        text = warnings.formatwarning(message, category, filename, lineno, line)
+        self.write(text, file or sys.stderr)
+
+    def run(self):
+        while not self.halt.wait(self.interval):
+            self.show()
+
+    def __enter__(self):
+        self.started = perf_counter()
+        self.showwarning, warnings.showwarning = warnings.showwarning, self.warn
+        self.ticker = threading.Thread(target=self.run, daemon=True)
+        self.ticker.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped = perf_counter()
+        self.halt.set()
+        self.ticker.join()
+        warnings.showwarning = self.showwarning
+        self.show(end='\n')
+
+    def metrics(self):
+        return {
+            'items': self.done,
+            'total': self.total,
+            'seconds': self.elapsed,
+            'rate': self.throughput,
+            'workers': self.workers,
+            'utilisation': self.utilisation,
+        }
+
+
+def escape_label(value):
+    """
+    Label value escaped for the Prometheus text format.
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus(record):
+    """
+    Build ``record`` (see `write_metrics`) in Prometheus text format.
+    """
+    metrics = {
+        'naslagwerk_build_timestamp_seconds': ('Time the build finished', [({}, record['time'])]),
+        'naslagwerk_build_seconds': ('Duration of the build stages', [
+            ({'stage': stage}, seconds) for stage, seconds in record['stages'].items()
+        ]),
+        'naslagwerk_build_pages_per_second': ('Pages written per second', [
+            ({}, record['pages']['rate'])
+        ] if record.get('pages') else []),
+        'naslagwerk_build_worker_utilisation': ('Share of worker time spent working', [
+            ({'stage': stage}, value) for stage, value in (
+                record['pages']['utilisation'].items()
+                if isinstance(record['pages']['utilisation'], dict)
+                else [('pages', record['pages']['utilisation'])]
+            )
+        ] if record.get('pages') else []),
+        'naslagwerk_build_pages': ('Pages written per site', [
+            ({'site': site}, values['pages']) for site, values in record['sites'].items()
+        ]),
+        'naslagwerk_build_store_files': ('Content files added/changed/removed in the page store', [
+            ({'site': site, 'change': change}, values[change])
+            for site, values in record['sites'].items()
+            for change in ['added', 'changed', 'removed'] if change in values
+        ]),
+        'naslagwerk_build_output_files': ('Files in the output manifest', [
+            ({'site': site}, values['files'])
+            for site, values in record['sites'].items() if 'files' in values
+        ]),
+    }
+    lines = []
+    for name, (help, samples) in metrics.items():
+        if not samples:
+            continue
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+        for labels, value in samples:
+            labels = ','.join(f'{k}="{escape_label(v)}"' for k, v in labels.items())
+            lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+    return '\n'.join(lines) + '\n'
+
+
+def write_metrics(path, record):
+    """
+    Write build metrics ``record`` (dict with time, stages, pages and sites)
+    to ``path``: as Prometheus textfile (replaced atomically) if the suffix
+    is ``.prom``, otherwise appended as json line.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix == '.prom':
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(prometheus(record), encoding='utf8')
+        os.replace(tmp, path)
+    else:
+        with open(path, 'a', encoding='utf8') as f:
+            f.write(json.dumps(record) + '\n')
+
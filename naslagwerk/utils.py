@@ -54,6 +54,23 @@ class Stopwatch:
         return [t2 - t1 for t1, t2 in zip(self.times, self.times[1:])]
 
 
+BOOLEAN_STATES = {**ConfigParser.BOOLEAN_STATES, 'ja': True, 'nee': False, '': False}
+
+
+def is_true(value):
+    """
+    Truth of a yes/no setting from config.ini or a converter argument
+    (1/yes/true/on/ja or 0/no/false/off/nee, any case; None or empty is
+    false), as ``ConfigParser.getboolean`` reads it.
+    """
+    if value is None or isinstance(value, bool):
+        return bool(value)
+    try:
+        return BOOLEAN_STATES[str(value).strip().lower()]
+    except KeyError:
+        raise ValueError(f"geen geldige ja/nee-waarde: {value!r}") from None
+
+
 def load_ini(path):
     config = ConfigParser()
     config.read(path, encoding='utf8')
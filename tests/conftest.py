@@ -0,0 +1,60 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+
+ROOT = Path(__file__).parent.parent
+
+PAGES = [
+    # page_id, section_order, section, chapter_order, chapter, page_order, page, code
+    ('aaaa0001', 1, 'Home', 1, None, 1, 'Home', None),
+    ('aaaa0002', 2, 'Inschrijving', 1, 'Aanmelden', 1, 'Start', 'AANM'),
+    ('aaaa0003', 2, 'Inschrijving', 1, 'Aanmelden', 2, 'Vervolg', None),
+    ('aaaa0004', 3, 'FAQ', 1, None, 1, 'Vragen', None),
+]
+
+
+def write_topography(path, pages):
+    df = pd.DataFrame(pages, columns=[
+        'page_id', 'section_order', 'section', 'chapter_order', 'chapter',
+        'page_order', 'page', 'code',
+    ])
+    df.insert(5, 'group_order', 1)
+    df.insert(6, 'group', None)
+    df.set_index('page_id').to_excel(path / 'topography.xlsx', sheet_name='site_topography')
+
+
+@pytest.fixture
+def site(tmp_path):
+    """
+    Small naslagwerk with a page per record in PAGES; every page text refers
+    to [AANM].
+    """
+    path = tmp_path / 'site'
+    (path / 'content').mkdir(parents=True)
+    (path / 'config.ini').write_text('[PROPERTIES]\ntitle = Test\n', encoding='utf8')
+    write_topography(path, PAGES)
+    for page_id, *_, page, code in PAGES:
+        text = f"{page_id}\nPagina {page}, zie [AANM].\n"
+        (path / 'content' / f"{page_id}.md").write_text(text, encoding='utf8')
+    return path
+
+
+def run(script, *args):
+    result = subprocess.run(
+        [sys.executable, script, *map(str, args)],
+        cwd=ROOT, capture_output=True, text=True, encoding='utf8',
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    return result
+
+
+@pytest.fixture
+def build():
+    """
+    Run build_site.py with the given arguments.
+    """
+    return lambda *args: run('build_site.py', *args)
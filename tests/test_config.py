@@ -0,0 +1,27 @@
+import pytest
+
+from naslagwerk.utils import is_true
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('true', True), ('Yes', True), ('on', True), ('ja', True), ('1', True),
+    ('False', False), ('no', False), ('off', False), ('nee', False), ('0', False),
+    ('', False), (None, False),
+])
+def test_is_true(value, expected):
+    assert is_true(value) is expected
+
+
+def test_is_true_rejects_other_values():
+    with pytest.raises(ValueError):
+        is_true('misschien')
+
+
+@pytest.mark.parametrize('offline, worker', [('False', False), ('off', False), ('Yes', True)])
+def test_offline_setting(site, build, offline, worker):
+    config = site / 'config.ini'
+    config.write_text(f"{config.read_text(encoding='utf8')}offline = {offline}\n", encoding='utf8')
+    build(site)
+    assert (site / 'output' / 'sw.js').exists() is worker
+    html = (site / 'output' / 'index.html').read_text(encoding='utf8')
+    assert ("register('sw.js')" in html) is worker
@@ -0,0 +1,42 @@
+import shutil
+
+from conftest import run
+from naslagwerk.publish import read_manifest
+
+
+def test_removed_page_is_listed_for_deletion(site, build, tmp_path):
+    output = site / 'output'
+    build(site)
+    deployed = tmp_path / 'deployed.json'
+    shutil.copyfile(output / 'manifest.json', deployed)
+
+    (site / 'content' / 'aaaa0003.md').unlink()
+    build(site)
+    result = run('deploy_delta.py', deployed, output)
+    assert 'D\tinschrijving/aanmelden/vervolg.html' in result.stdout.splitlines()
+    assert not any(line.startswith('D\tfaq/') for line in result.stdout.splitlines())
+
+
+def test_partial_build_keeps_other_pages_in_manifest(site, build, tmp_path):
+    output = site / 'output'
+    build(site)
+    deployed = tmp_path / 'deployed.json'
+    shutil.copyfile(output / 'manifest.json', deployed)
+
+    build(site, '--only', 'section=FAQ')
+    result = run('deploy_delta.py', deployed, output)
+    assert not any(line.startswith('D\t') for line in result.stdout.splitlines())
+
+
+def test_partial_staged_build_keeps_live_pages_in_manifest(site, build, tmp_path):
+    output = site / 'output'
+    staging = tmp_path / 'staging'
+    build(site, '--stage', staging)
+    deployed = tmp_path / 'deployed.json'
+    shutil.copyfile(output / 'manifest.json', deployed)
+
+    shutil.rmtree(staging)
+    build(site, '--stage', staging, '--only', 'section=FAQ')
+    result = run('deploy_delta.py', deployed, output)
+    assert not any(line.startswith('D\t') for line in result.stdout.splitlines())
+    assert 'inschrijving/aanmelden/start.html' in read_manifest(output)
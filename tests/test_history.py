@@ -0,0 +1,46 @@
+import os
+import subprocess
+
+from naslagwerk import history
+from naslagwerk.history import git_dates
+
+
+def commit(repo, message, timestamp):
+    env = {
+        **os.environ,
+        'GIT_AUTHOR_DATE': f"@{timestamp} +0000",
+        'GIT_COMMITTER_DATE': f"@{timestamp} +0000",
+    }
+    subprocess.run(['git', 'add', '-A'], cwd=repo, check=True)
+    subprocess.run(
+        ['git', '-c', 'user.name=t', '-c', 'user.email=t@t', 'commit', '-qm', message],
+        cwd=repo, check=True, env=env)
+
+
+def test_rename_keeps_created_date(tmp_path):
+    repo = tmp_path / 'repo'
+    repo.mkdir()
+    subprocess.run(['git', 'init', '-q'], cwd=repo, check=True)
+    (repo / 'a.md').write_text('abcd1234\n' + 'tekst\n' * 20, encoding='utf8')
+    commit(repo, 'add', 1_000_000)
+    (repo / 'a.md').rename(repo / 'b.md')
+    commit(repo, 'rename', 2_000_000)
+    cache = tmp_path / 'dates.json'
+    dates = git_dates(repo, cache)
+    assert dates[str(repo.resolve() / 'b.md')] == (1_000_000, 1_000_000)
+
+    # incremental: rename again and edit, walking only the new commits
+    (repo / 'b.md').rename(repo / 'c.md')
+    commit(repo, 'rename', 3_000_000)
+    with open(repo / 'c.md', 'a', encoding='utf8') as f:
+        f.write('meer\n')
+    commit(repo, 'edit', 4_000_000)
+    dates = git_dates(repo, cache)
+    assert dates[str(repo.resolve() / 'c.md')] == (1_000_000, 4_000_000)
+
+
+def test_without_git(tmp_path, monkeypatch):
+    def missing(*args, **kwargs):
+        raise FileNotFoundError('git')
+    monkeypatch.setattr(history.subprocess, 'run', missing)
+    assert git_dates(tmp_path) == {}
@@ -0,0 +1,59 @@
+import re
+
+
+TEXT = """aaaa0004
+Zie [AANM] -> ctrl+c.
+
+    [AANM] -> ctrl+c
+
+_____
+|table: virtual=true
+a, b
+1, '<b>vet</b>'
+_____
+"""
+
+
+def test_postprocess_skips_code_and_scripts(site, build):
+    (site / 'content' / 'aaaa0004.md').write_text(TEXT, encoding='utf8')
+    result = build(site)
+    html = (site / 'output' / 'faq' / 'vragen.html').read_text(encoding='utf8')
+    assert '<a class="crossref" href="../inschrijving/aanmelden/start.html">AANM</a> &rarr;' in html
+    assert '<kbd>ctrl</kbd> + <kbd>c</kbd>' in html
+    assert '<pre><code>[AANM] -&gt; ctrl+c\n</code></pre>' in html
+    # the table script is written as is, without crossref warnings
+    assert 'a[sortBy] ?? ""' in html
+    assert 'crossref [' not in result.stdout + result.stderr
+
+
+def test_virtual_table_fallback_escapes_like_client(site, build):
+    (site / 'content' / 'aaaa0004.md').write_text(TEXT, encoding='utf8')
+    build(site)
+    [fallback] = (site / 'output' / 'data').glob('*.html')
+    html = fallback.read_text(encoding='utf8')
+    assert '<td>&lt;b&gt;vet&lt;/b&gt;</td>' in html
+
+
+def test_lazy_fragments_are_postprocessed(site, build):
+    text = "_____\n|collapsible: lazy=1\n### Vraag:hide\nZie [AANM] -> hier.\n_____\n"
+    for page_id in ['aaaa0003', 'aaaa0004']:
+        path = site / 'content' / f"{page_id}.md"
+        path.write_text(f"{page_id}\n{text}", encoding='utf8')
+    build(site)
+    output = site / 'output'
+    fragments = {}
+    for page in ['inschrijving/aanmelden/vervolg.html', 'faq/vragen.html']:
+        html = (output / page).read_text(encoding='utf8')
+        [src] = re.findall(r'data-src="([^"]+)"', html)
+        fragments[page] = (output / page).parent.joinpath(src).resolve().read_text(encoding='utf8')
+    assert '<a class="crossref" href="../../inschrijving/aanmelden/start.html">AANM</a> &rarr; hier.' \
+        in fragments['inschrijving/aanmelden/vervolg.html']
+    assert '<a class="crossref" href="../inschrijving/aanmelden/start.html">AANM</a> &rarr; hier.' \
+        in fragments['faq/vragen.html']
+
+
+def test_unknown_page_id_is_a_warning(site, build):
+    (site / 'content' / 'los.md').write_text('zzzz9999\nwees\n', encoding='utf8')
+    result = build(site)
+    assert 'WAARSCHUWING' in result.stderr
+    assert 'WAARSCHUWING' not in result.stdout
@@ -0,0 +1,36 @@
+import shutil
+
+import pytest
+
+
+def pages(output):
+    return {path.relative_to(output).as_posix() for path in output.rglob('*.html')}
+
+
+@pytest.mark.parametrize('mode', ['versioned', 'in-place'])
+def test_stage_only_keeps_other_live_pages(site, build, tmp_path, mode):
+    output = site / 'output'
+    if mode == 'in-place':
+        output.mkdir()
+    staging = tmp_path / 'staging'
+    build(site, '--stage', staging)
+    before = pages(output)
+    assert 'faq/vragen.html' in before and 'index.html' in before
+
+    # partial build from a wiped staging directory
+    shutil.rmtree(staging)
+    result = build(site, '--stage', staging, '--only', 'section=FAQ')
+    assert '0 removed' in result.stdout
+    assert pages(output) == before
+    assert (output / 'css' / 'base.css').exists()
+
+
+def test_stage_full_build_removes_deleted_pages(site, build, tmp_path):
+    output = site / 'output'
+    staging = tmp_path / 'staging'
+    build(site, '--stage', staging)
+    (site / 'content' / 'aaaa0003.md').unlink()
+    shutil.rmtree(staging)
+    build(site, '--stage', staging)
+    assert 'inschrijving/aanmelden/vervolg.html' not in pages(output)
+    assert 'faq/vragen.html' in pages(output)
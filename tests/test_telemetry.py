@@ -0,0 +1,35 @@
+import io
+import warnings
+
+from naslagwerk.telemetry import Progress, prometheus
+
+
+class Terminal(io.StringIO):
+    def isatty(self):
+        return True
+
+
+def test_prometheus_escapes_label_values():
+    record = {
+        'time': 1,
+        'stages': {},
+        'sites': {'a"b\\c\nd': {'pages': 3}},
+    }
+    text = prometheus(record)
+    assert 'naslagwerk_build_pages{site="a\\"b\\\\c\\nd"} 3' in text.splitlines()
+
+
+def test_warnings_clear_and_redraw_status_line(capsys):
+    stream, errors = Terminal(), io.StringIO()
+    with Progress(10, stream=stream, interval=60) as progress:
+        progress.show()
+        with warnings.catch_warnings():
+            warnings.simplefilter('always')
+            warnings.warn_explicit('crossref [X] komt niet voor', UserWarning, 'page.py', 1)
+        progress.write('los bericht', errors)
+    assert 'crossref [X] komt niet voor' in capsys.readouterr().err
+    output = stream.getvalue()
+    line = progress.line()
+    # cleared before each message and drawn again after it
+    assert output.count('\r' + ' ' * len(line) + '\r\r' + line) == 2
+    assert errors.getvalue() == 'los bericht\n'
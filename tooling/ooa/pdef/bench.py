@@ -0,0 +1,50 @@
+"""
+Benchmark van de tabelbouwers op een (productie)proces:
+
+    python -m pdef.bench INSCHRIJVING_BA HERINSCHRIJVING
+
+De datasets worden één keer geladen; elke bouwer wordt ``repeat`` keer
+gedraaid en de snelste en mediane tijd worden gerapporteerd.
+"""
+import sys
+from statistics import median
+from time import perf_counter
+
+import pandas as pd
+
+import pdef.tabel as tbl
+from pdef.dataset import load_pdef_datasets
+
+
+def timeit(func, *args, repeat=5):
+    tijden = []
+    for _ in range(repeat):
+        start = perf_counter()
+        result = func(*args)
+        tijden.append(perf_counter() - start)
+    return result, tijden
+
+
+def benchmark(proces, repeat=5):
+    datasets = load_pdef_datasets(proces)
+    pdef_ps, t_ps = timeit(tbl.maak_ps, datasets, repeat=repeat)
+    pdef_antw, t_antw = timeit(tbl.maak_antw, datasets, repeat=repeat)
+    pdef_opl, t_opl = timeit(tbl.maak_opl, datasets, pdef_ps, repeat=repeat)
+
+    rijen = {
+        'maak_ps': (len(datasets.processtappen), len(pdef_ps), t_ps),
+        'maak_antw': (len(datasets.antwoorden), len(pdef_antw), t_antw),
+        'maak_opl': (len(datasets.opleidingen), len(pdef_opl.koppeling), t_opl),
+    }
+    return pd.DataFrame(
+        [
+            (proces, name, n_in, n_uit, min(tijden), median(tijden))
+            for name, (n_in, n_uit, tijden) in rijen.items()
+        ],
+        columns=['proces', 'bouwer', 'rijen_in', 'rijen_uit', 'min', 'mediaan'],
+    ).set_index(['proces', 'bouwer'])
+
+
+if __name__ == '__main__':
+    processen = sys.argv[1:] or ['INSCHRIJVING_BA']
+    print(pd.concat([benchmark(proces) for proces in processen]))
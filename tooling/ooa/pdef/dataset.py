@@ -1,101 +1,180 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
 from types import SimpleNamespace
 import pandas as pd
 from query import QueryResult
 
 
-def load_pdef_datasets(proces):
+AUDIT_COLUMNS = [
+    'creatie_gebruiker',
+    'creatie_applicatie',
+    'creatie_datum',
+    'mutatie_gebruiker',
+    'mutatie_applicatie',
+    'mutatie_datum',
+]
+AUTOV_TABELLEN = {
+    'overgang':        'OST_IO_PROCES_AUT_OVERGANG',
+    'regel':           'OST_IO_PROCES_AUT_OV_RG',
+    'aanvraag':        'OST_IO_PROCES_AUT_OV_RG_AANV',
+    'rubriek':         'OST_IO_PROCES_AUT_OV_RG_HOOFD',
+    'processtap':      'OST_IO_PROCES_AUT_OV_RG_PS',
+    'antwoord':        'OST_IO_PROCES_AUT_OV_RG_AW_PS',
+    'omhangen':        'OST_IO_PROCES_AUT_OV_RG_OMHANG',
+    'termijnbewaking': 'OST_IO_PROCES_AUT_OV_RG_STERM',
+}
+PDEF_TABELLEN = [
+    'processtap_afh',
+    'processtap_antwoorden',
+    'processtap_opleiding',
+    'rubriek',
+    'labelteksten',
+    'processtappen',
+]
+REFERENTIES = ['OST_OPLEIDING', 'STT_UIX_LABEL', *AUTOV_TABELLEN.values()]
+# session cache: in memory only, so it is rebuilt on every run and in every
+# worker process (to_excel_batch hands the loaded tables to its workers)
+PRELOADED = {}
+# default folder with the `referentie` and `ref_ooa` extracts; the loaders
+# take a ``root`` to read from another folder
+ROOT = Path()
+
+
+def folder(root=None):
+    return Path(ROOT if root is None else root)
+
+
+def load_parallel(loader, names, workers=8):
+    with ThreadPoolExecutor(workers) as pool:
+        return dict(zip(names, pool.map(loader, names)))
+
+
+def load_referenties(root=None):
+    """
+    Load all reference tables (in parallel) into the in-memory session
+    cache.
+    """
+    return load_parallel(lambda table: load_referentie(table, root), REFERENTIES)
+
+
+def preload(referenties):
+    """
+    Seed the session cache with reference tables that were already loaded
+    elsewhere (e.g. as initializer of worker processes).
+    """
+    PRELOADED.update(referenties)
+
+
+@lru_cache(maxsize=None)
+def load_referentie(table, root=None):
+    """
+    Load reference table once per session (without audit columns).
+    """
+    if root is None and table in PRELOADED:
+        return PRELOADED[table]
+    return (
+        QueryResult
+        .read_pickle((folder(root) / f"referentie/ref_{table}").as_posix())
+        .frame
+        .rename(columns=str.lower)
+        .drop(AUDIT_COLUMNS, axis=1, errors='ignore')
+    )
+
+
+@lru_cache(maxsize=None)
+def proces_slices(table, root=None):
+    """
+    Split reference table with `io_proces` column into per process slices;
+    kept in memory for the rest of the session, not on disk.
+    """
+    df = load_referentie(table, root)
+    return {
+        proces: data.drop('io_proces', axis=1)
+        for proces, data in df.groupby('io_proces', sort=False)
+    }
+
+
+def load_proces_slice(table, proces, root=None):
+    df = load_referentie(table, root)
+    if not 'io_proces' in df.columns:
+        return df
+    empty = df.iloc[:0].drop('io_proces', axis=1)
+    return proces_slices(table, root).get(proces, empty)
+
+
+def clear_cache():
+    """
+    Clear the session cache (e.g. after a new Osiris extract).
+    """
+    PRELOADED.clear()
+    load_referentie.cache_clear()
+    proces_slices.cache_clear()
+
+
+def bronbestanden(proces, root=None):
+    """
+    Extract files under ``root`` (default ROOT) the datasets of ``proces``
+    are read from.
+    """
+    names = [
+        *(f"ref_ooa/{t}_{proces}" for t in PDEF_TABELLEN),
+        *(f"referentie/ref_{t}" for t in REFERENTIES),
+    ]
+    return sorted(
+        path
+        for name in names
+        for pattern in [name, f"{name}.*"]
+        for path in folder(root).glob(pattern)
+        if path.is_file()
+    )
+
+
+def load_pdef_datasets(proces, root=None):
     # proces = proces.lower()
-    load_qr = lambda t: QueryResult.read_feather(f"ref_ooa/{t}_{proces}").frame
+    load_qr = lambda t: (
+        QueryResult.read_feather((folder(root) / f"ref_ooa/{t}_{proces}").as_posix()).frame)
 
-    afh   = load_qr('processtap_afh')
-    antw  = load_qr('processtap_antwoorden')
-    opl   = load_qr('processtap_opleiding')
-    rub   = load_qr('rubriek')
-    label = load_qr('labelteksten')
+    with ThreadPoolExecutor(8) as pool:
+        ref_opleiding = pool.submit(load_referentie, 'OST_OPLEIDING', root)
+        ref_label = pool.submit(load_referentie, 'STT_UIX_LABEL', root)
+        datasets = dict(zip(PDEF_TABELLEN, pool.map(load_qr, PDEF_TABELLEN)))
 
     actor_cats = pd.CategoricalDtype(['S', 'A', 'I', 'D'], ordered=True)
     ps = (
-        load_qr('processtappen')
+        datasets['processtappen']
         .rename(columns={'hs_volgnummer':'hs_nr', 'ps_volgnummer': 'ps_nr'})
         .astype({'actor': actor_cats})
         .sort_values(['actor', 'hs_nr', 'ps_nr'])
     )
     ropl = (
-        QueryResult
-        .read_pickle("referentie/ref_OST_OPLEIDING")
-        .frame
-        .rename(columns=str.lower)
+        ref_opleiding.result()
         [['opleiding', 'faculteit', 'aggregaat_1', 'aggregaat_2']]
         .replace({'faculteit': {'IVLOS': 'GST', 'RA': 'UCR', 'SW': 'FSW'}})
         .assign(aanwezig='O')
     )
-    stdlabels = (
-        QueryResult
-        .read_pickle("referentie/ref_STT_UIX_LABEL")
-        .frame
-        .rename(columns=str.lower)
-        .rename(columns={'ulab_id': 'label_id'})
-    )
+    stdlabels = ref_label.result().rename(columns={'ulab_id': 'label_id'})
 
     return SimpleNamespace(**{
         'processtappen': ps,
-        'afhankelijkheden': afh,
-        'antwoorden': antw,
-        'opleidingen': opl,
-        'rubrieken': rub,
-        'labels': label,
+        'afhankelijkheden': datasets['processtap_afh'],
+        'antwoorden': datasets['processtap_antwoorden'],
+        'opleidingen': datasets['processtap_opleiding'],
+        'rubrieken': datasets['rubriek'],
+        'labels': datasets['labelteksten'],
         'stdlabels': stdlabels,
         'refopleiding': ropl,
     })
 
 
-def load_autov_datasets(proces):
-    def load_qr(table):
-        return (
-            QueryResult
-            .read_pickle(f"referentie/ref_{table}")
-            .frame
-            .rename(columns=str.lower)
-        )
-    tabellen = {
-        'overgang':        'OST_IO_PROCES_AUT_OVERGANG',
-        'regel':           'OST_IO_PROCES_AUT_OV_RG',
-        'aanvraag':        'OST_IO_PROCES_AUT_OV_RG_AANV',
-        'rubriek':         'OST_IO_PROCES_AUT_OV_RG_HOOFD',
-        'processtap':      'OST_IO_PROCES_AUT_OV_RG_PS',
-        'antwoord':        'OST_IO_PROCES_AUT_OV_RG_AW_PS',
-        'omhangen':        'OST_IO_PROCES_AUT_OV_RG_OMHANG',
-        'termijnbewaking': 'OST_IO_PROCES_AUT_OV_RG_STERM',
-    }
-
-    datasets = {k:load_qr(v) for k,v in tabellen.items()}
-    heeft_io_proces = pd.Series(
-        index = datasets.keys(),
-        data = ['io_proces' in i.columns for i in datasets.values()],
-        name = 'heeft_io_proces'
-    )
-
-    heeft_iaor_id = pd.Series(
-        index = datasets.keys(),
-        data = ['iaor_id' in i.columns for i in datasets.values()],
-        name = 'heeft_iaor_id'
-    )
+def load_autov_datasets(proces, root=None):
+    load_parallel(lambda table: load_referentie(table, root), list(AUTOV_TABELLEN.values()))
 
-    def prep(key, df):
-        to_drop = [
-            'io_proces',
-            'creatie_gebruiker',
-            'creatie_applicatie',
-            'creatie_datum',
-            'mutatie_gebruiker',
-            'mutatie_applicatie',
-            'mutatie_datum',
-        ]
-        if heeft_io_proces.loc[key]:
-            df = df.query(f"io_proces == '{proces}'")
-        if heeft_iaor_id.loc[key]:
+    def prep(table):
+        df = load_proces_slice(table, proces, root)
+        if 'iaor_id' in df.columns:
             df = df.set_index('iaor_id')
-        return df.drop(to_drop, axis=1, errors='ignore')
+        return df
 
-    proces_autov = {k:prep(k,v) for k,v in datasets.items()}
+    proces_autov = {k:prep(v) for k,v in AUTOV_TABELLEN.items()}
     return SimpleNamespace(**proces_autov)
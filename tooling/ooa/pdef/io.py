@@ -1,23 +1,70 @@
-def to_excel(proces, path):
-    filename = '.'.join(proces.lower().split('_'))
-    writer = pd.ExcelWriter(path / f"ooa.{filename}.pdef.xlsx")
-    workbook = writer.book
-    workbook.set_properties({
+import datetime
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from time import perf_counter
+
+import pandas as pd
+import xlsxwriter
+
+import pdef.naslag as naslag
+import pdef.stat as stat
+import pdef.tabel as tbl
+from pdef.dataset import (
+    load_autov_datasets,
+    load_pdef_datasets,
+    load_referenties,
+    preload,
+)
+
+
+def maak_pdef(proces, datasets=None):
+    if datasets is None:
+        datasets = load_pdef_datasets(proces)
+    pdef = tbl.maak_ps(datasets)
+    pdef_antw = tbl.maak_antw(datasets)
+    pdef_opl = tbl.maak_opl(datasets, pdef)
+    pdef_n = stat.maak_stats_aantallen(pdef)
+    pdef_fac = stat.maak_stats_aantallen_per_fac(pdef_opl)
+    return pdef, pdef_antw, pdef_opl, pdef_n, pdef_fac
+
+
+def maak_pdef_autov(proces, datasets=None):
+    if datasets is None:
+        datasets = load_autov_datasets(proces)
+    return tbl.maak_autov(datasets)
+
+
+def to_excel(proces, path, streaming=False):
+    pdef_tabellen = maak_pdef(proces)
+    pdef_autov = maak_pdef_autov(proces)
+    write = write_excel_streaming if streaming else write_excel
+    return write(proces, path, *pdef_tabellen, pdef_autov)
+
+
+def workbook_properties(proces):
+    return {
         'title':    f'procesdefinitie {proces.lower()}',
         'subject':  'osiris online application | procesdefinitie',
         'author':   'Centrale Studentenadministratie',
         'company':  'Universiteit Utrecht',
         'created':  datetime.date.today(),
-    })
+    }
 
-    pdef, pdef_antw, pdef_opl, pdef_n, pdef_fac = maak_pdef(proces)
-    pdef_autov = maak_pdef_autov(proces)
-    pdef.to_excel(writer, 'ps')
-    pdef_antw.to_excel(writer, 'antw')
-    pdef_opl.reset_index().to_excel(writer, 'opl')
-    pdef_autov.to_excel(writer, 'aut_ov')
-    pdef_n.to_excel(writer, 'stats')
-    pdef_fac.to_excel(writer, 'stats', startrow=len(pdef_n)+2)
+
+def write_excel(proces, path, pdef, pdef_antw, pdef_opl, pdef_n, pdef_fac, pdef_autov):
+    filename = '.'.join(proces.lower().split('_'))
+    writer = pd.ExcelWriter(path / f"ooa.{filename}.pdef.xlsx", engine='xlsxwriter')
+    workbook = writer.book
+    pdef_opl = tbl.opl_breed(pdef_opl)
+    workbook.set_properties(workbook_properties(proces))
+
+    pdef.to_excel(writer, sheet_name='ps')
+    pdef_antw.to_excel(writer, sheet_name='antw')
+    pdef_opl.reset_index().to_excel(writer, sheet_name='opl')
+    pdef_autov.to_excel(writer, sheet_name='aut_ov')
+    pdef_n.to_excel(writer, sheet_name='stats')
+    pdef_fac.to_excel(writer, sheet_name='stats', startrow=len(pdef_n)+2)
 
     for sheet, df in zip(['ps', 'antw', 'opl'], [pdef, pdef_antw, pdef_opl]):
         df = df.reset_index()
@@ -30,7 +77,197 @@ def to_excel(proces, path):
 
     workbook.add_worksheet(proces.lower())
     workbook.get_worksheet_by_name(proces.lower()).set_tab_color('#FF9900')
-    writer.save()
+    writer.close()
+
+
+def write_excel_streaming(
+    proces, path, pdef, pdef_antw, pdef_opl, pdef_n, pdef_fac, pdef_autov,
+    geheugen=True,
+):
+    """
+    Schrijf dezelfde werkmap als `write_excel` in constant memory mode: elk
+    werkblad wordt rij voor rij weggeschreven (de brede opl-matrix wordt
+    niet opgebouwd) en opmaak wordt per kolom/rij i.p.v. per cel gezet.
+    Geeft per werkblad het aantal rijen, de tijd en (met ``geheugen``, via
+    tracemalloc wat het schrijven vertraagt) het piekgeheugen.
+    """
+    filename = '.'.join(proces.lower().split('_'))
+    workbook = xlsxwriter.Workbook(
+        path / f"ooa.{filename}.pdef.xlsx", {'constant_memory': True})
+    workbook.set_properties(workbook_properties(proces))
+    formats = {
+        'header': workbook.add_format({'bold': True, 'border': 1}),
+        'index': workbook.add_format({'bold': True, 'border': 1}),
+    }
+
+    def ps(worksheet):
+        return stream_tabel(worksheet, pdef, formats, verberg_index=True)
+
+    def antw(worksheet):
+        return stream_tabel(worksheet, pdef_antw, formats, verberg_index=True)
+
+    def opl(worksheet):
+        return stream_opl(worksheet, pdef_opl, formats)
+
+    def aut_ov(worksheet):
+        return stream_tabel(worksheet, pdef_autov, formats)
+
+    def stats(worksheet):
+        n = stream_tabel(worksheet, pdef_n, formats)
+        return n + stream_tabel(worksheet, pdef_fac, formats, startrow=len(pdef_n)+2)
+
+    tracing = tracemalloc.is_tracing()
+    if geheugen and not tracing:
+        tracemalloc.start()
+    werkbladen = {}
+    for write in [ps, antw, opl, aut_ov, stats]:
+        worksheet = workbook.add_worksheet(write.__name__)
+        tracemalloc.reset_peak()
+        basis = tracemalloc.get_traced_memory()[0]
+        start = perf_counter()
+        rijen = write(worksheet)
+        werkbladen[write.__name__] = {'rijen': rijen, 'tijd': perf_counter() - start}
+        if tracemalloc.is_tracing():
+            piek = tracemalloc.get_traced_memory()[1] - basis
+            werkbladen[write.__name__]['piek_mb'] = piek / 2**20
+    if geheugen and not tracing:
+        tracemalloc.stop()
+
+    workbook.add_worksheet(proces.lower()).set_tab_color('#FF9900')
+    workbook.close()
+    return pd.DataFrame.from_dict(werkbladen, orient='index').rename_axis('werkblad')
+
+
+def waarden(row):
+    return [None if pd.isna(value) else value for value in row]
+
+
+def stream_tabel(worksheet, df, formats, startrow=0, verberg_index=False):
+    """
+    Schrijf ``df`` rij voor rij zoals `DataFrame.to_excel` (kolomkoppen met
+    indexnamen, herhaalde indexwaarden weggelaten). Geeft aantal rijen.
+    """
+    nlevels = df.index.nlevels
+    worksheet.set_row(startrow, None, formats['header'])
+    worksheet.write_row(startrow, 0, [*df.index.names, *df.columns])
+    if verberg_index:
+        worksheet.set_column(0, 0, None, None, {'hidden': 1})
+        worksheet.set_column(1, 5, None, formats['index'])
+        worksheet.autofilter(startrow, 0, startrow + len(df), nlevels + df.shape[1] - 1)
+        worksheet.freeze_panes(startrow + 1, 0)
+    else:
+        worksheet.set_column(0, nlevels - 1, None, formats['index'])
+
+    vorige = ()
+    for row, (index, *values) in enumerate(df.itertuples(name=None), startrow + 1):
+        index = index if nlevels > 1 else (index,)
+        # net als pandas: alleen index labels tonen die verschillen van vorige rij
+        gelijk = next(
+            (i for i, (a, b) in enumerate(zip(index[:-1], vorige)) if not a == b),
+            min(len(vorige), nlevels - 1))
+        labels = [None] * gelijk + list(index[gelijk:])
+        worksheet.write_row(row, 0, waarden(labels) + waarden(values))
+        vorige = index
+    return len(df)
+
+
+def stream_opl(worksheet, opl, formats):
+    """
+    Schrijf overzicht processtap-opleiding rij voor rij vanuit de lange vorm
+    (zie `tabel.opl_rijen`); zelfde indeling als `format_pdef_opl`.
+    """
+    kolommen = opl.kolommen
+    nindex = len(tbl.OPL_GROUPBY)
+    nlevels = kolommen.nlevels
+    eerste = nindex + 1
+
+    for level in range(nlevels):
+        labels = kolommen.get_level_values(level)
+        if level < nlevels - 1:
+            codes = kolommen.codes[:level + 1]
+            nieuw = [
+                i == 0 or any(c[i] != c[i-1] for c in codes)
+                for i in range(len(labels))
+            ]
+            labels = [label if n else None for label, n in zip(labels, nieuw)]
+        worksheet.write(level, nindex, kolommen.names[level], formats['index'])
+        worksheet.write_row(level, eerste, list(labels), formats['header'])
+        if level == 0:
+            worksheet.write(level, eerste + len(kolommen), 'aantal', formats['header'])
+    worksheet.write_row(nlevels, 1, tbl.OPL_GROUPBY, formats['index'])
+
+    worksheet.set_column(0, 0, None, None, {'hidden': 1})
+    worksheet.set_column(1, 5, None, formats['index'])
+    row = nlevels
+    for row, (index, values) in enumerate(tbl.opl_rijen(opl), nlevels + 1):
+        worksheet.write_row(row, 0, [row - nlevels - 1, *waarden(index), *values])
+    worksheet.autofilter(nlevels, 0, row, eerste + len(kolommen))
+    worksheet.freeze_panes(nlevels + 1, eerste)
+    return row - nlevels
+
+
+def verwerk_proces(proces, path, fragmenten=True, streaming=False):
+    """
+    Maak excel (en naslagfragmenten) voor één proces; geeft tijden per stap.
+    """
+    filename = '.'.join(proces.lower().split('_'))
+    tijden = {}
+
+    start = perf_counter()
+    datasets = load_pdef_datasets(proces)
+    autov_datasets = load_autov_datasets(proces)
+    tijden['laden'] = perf_counter() - start
+
+    start = perf_counter()
+    pdef_tabellen = maak_pdef(proces, datasets)
+    pdef_autov = maak_pdef_autov(proces, autov_datasets)
+    tijden['maken'] = perf_counter() - start
+
+    start = perf_counter()
+    if streaming:
+        write_excel_streaming(proces, path, *pdef_tabellen, pdef_autov, geheugen=False)
+    else:
+        write_excel(proces, path, *pdef_tabellen, pdef_autov)
+    tijden['excel'] = perf_counter() - start
+
+    if fragmenten:
+        start = perf_counter()
+        html = naslag.processtappen(datasets)
+        (path / f"ooa.{filename}.processtappen.html").write_text(html, encoding='utf8')
+        html = naslag.autov(pdef_autov)
+        (path / f"ooa.{filename}.autov.html").write_text(html, encoding='utf8')
+        tijden['naslag'] = perf_counter() - start
+    return tijden
+
+
+def to_excel_batch(processen, path, workers=None, fragmenten=True, streaming=False):
+    """
+    Maak procesdefinities voor alle ``processen`` in één run. De referentie-
+    tabellen worden één keer geladen en aan de workers meegegeven; de
+    processen worden verdeeld over een process pool. Geeft overzicht met
+    tijden per proces (en eventuele fout).
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    referenties = load_referenties()
+
+    resultaten = {}
+    with ProcessPoolExecutor(workers, initializer=preload, initargs=(referenties,)) as pool:
+        futures = {
+            pool.submit(verwerk_proces, proces, path, fragmenten, streaming): proces
+            for proces in processen
+        }
+        for future in as_completed(futures):
+            proces = futures[future]
+            try:
+                resultaten[proces] = future.result()
+            except Exception as e:
+                resultaten[proces] = {'fout': repr(e)}
+            print(f" «{proces}» {resultaten[proces]}", flush=True)
+
+    overzicht = pd.DataFrame.from_dict(resultaten, orient='index').reindex(processen)
+    tijden = overzicht.columns.difference(['fout'], sort=False)
+    return overzicht.assign(totaal=overzicht[tijden].sum(axis=1))
 
 
 def add_autofilter(worksheet, df):
@@ -62,15 +299,11 @@ def format_pdef_opl(writer, df):
     empty_format = workbook.add_format({'bold': False, 'border': 0})
     worksheet = writer.sheets['opl']
 
-    for col, val in zip(range(1,10), df.index.names):
-        worksheet.write(4, col, val, index_format)
-
-    for row, val in zip(range(0,4), df.columns.names):
-        worksheet.write(row, 9, val, index_format)
+    worksheet.write_row(4, 1, df.index.names[:9], index_format)
 
+    worksheet.write_column(0, 9, df.columns.names, index_format)
     for row in range(0,4):
-        for col in range(0,9):
-            worksheet.write(row, col, ' ', empty_format)
+        worksheet.write_row(row, 0, [' '] * 9, empty_format)
 
     worksheet.freeze_panes(df.columns.nlevels + 1, 10)
 
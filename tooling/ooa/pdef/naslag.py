@@ -1,3 +1,5 @@
+from pathlib import Path
+
 import pandas as pd
 from pandas.io.formats.style import Styler
 from jinja2 import Environment, FileSystemLoader
@@ -5,7 +7,7 @@ from jinja2 import Environment, FileSystemLoader
 import pdef.tabel as tbl
 
 
-loader = FileSystemLoader(searchpath='templates')
+loader = FileSystemLoader(searchpath=Path(__file__).parent.parent / 'templates')
 ENV = Environment(loader=loader, trim_blocks=True, lstrip_blocks=True)
 
 
@@ -18,7 +20,7 @@ def processtappen(pdef):
         tbl.maak_ps(pdef)
         .merge(rubrieken, how='left')
         .assign(
-            onderdeel = lambda df: df.actor.replace(to_replace),
+            onderdeel = lambda df: df.actor.astype(object).replace(to_replace),
             is_afh = lambda df: df.is_afh.replace({True: 'ja', False: 'nee'}))
     )
 
@@ -54,18 +56,12 @@ def processtappen(pdef):
     return template.render(data=data)
 
 
-def autov(table):
-    styles = [
-        {'selector': '',
-        'props': 'font-size: .9em;'},
-        {'selector': 'tbody th:not(.level0)',
-        'props': 'background-color: transparent; color: black;'},
-        {'selector': 'tbody :not(.level0):hover',
-        'props': 'background-color: transparent;'},
-        {'selector': 'tbody th.level0',
-        'props': 'background-color: var(--color-theme-light);'},
-    ]
-
+def autov(table, render=None):
+    """
+    Html of autov ``table``. ``render`` renders the table; the naslagwerk
+    passes its single-pass renderer, standalone the pandas Styler is used.
+    """
+    if render is None:
+        render = lambda df: Styler(df, cell_ids=False).to_html()
     template = ENV.get_template('pdef.autov.jinja')
-    data = Styler(table, cell_ids=False).set_table_styles(styles).to_html()
-    return template.render(data=data)
+    return template.render(data=render(table))
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 
@@ -23,14 +24,28 @@ def maak_stats_aantallen(pdef_ps):
 
 
 def maak_stats_aantallen_per_fac(pdef_opl):
+    """
+    Per actor en faculteit het maximale aantal processtappen van een opleiding
+    (berekend op het lange overzicht uit `tabel.maak_opl`).
+    """
+    stappen, koppeling = pdef_opl.stappen, pdef_opl.koppeling
+    actors = pd.CategoricalDtype(['S', 'A', 'I', 'D'])
+    actor = stappen.actor.astype(actors).cat.codes.to_numpy()
+    universeel = np.bincount(
+        actor[stappen.universeel.to_numpy()], minlength=len(actors.categories))
+
+    aantallen = np.repeat(universeel[:, None], len(pdef_opl.kolommen), axis=1)
+    np.add.at(aantallen, (actor[koppeling.stap], koppeling.kolom), 1)
+
+    # actors zonder processtappen blijven leeg (NaN), zoals in het brede overzicht
+    aanwezig = np.isin(np.arange(len(actors.categories)), actor)
     return (
-        pdef_opl
-        .iloc[:,:-1]
-        .groupby(level=0)
-        .count()
-        .groupby(level=0, axis=1)
+        pd.DataFrame(aantallen, index=actors.categories, columns=pdef_opl.kolommen)
+        [aanwezig]
+        .reindex(actors.categories)
+        .rename_axis('actor')
+        .T.groupby(level=0)
         .max()
-        .reindex(['S', 'A', 'I', 'D'])
-        .T.assign(totaal=lambda df: df.sum(axis=1))
+        .assign(totaal=lambda df: df.sum(axis=1))
         .T.assign(totaal=lambda df: df.sum(axis=1))
     )
@@ -1,64 +1,85 @@
 from types import SimpleNamespace
+import numpy as np
 import pandas as pd
 
 
+PS_GROUPBY = [
+    'actor',
+    'hoofdstuk',
+    'hs_nr',
+    'processtap',
+    'ps_nr',
+    'tekst_nl',
+    'actueel',
+]
+PS_SLEUTEL = ['hoofdstuk', 'processtap']
+
+
+def sleutel(df, columns=PS_SLEUTEL):
+    """
+    Processtap sleutel (hoofdstuk, processtap) als MultiIndex; categoricals
+    worden op hun codes vergeleken i.p.v. via string concatenatie.
+    """
+    return pd.MultiIndex.from_arrays([df[col] for col in columns], names=PS_SLEUTEL)
+
+
 def test_afhankelijkheden(df1, df2, is_heeft):
-    s1 = df1.hoofdstuk.astype(object) + df1.processtap
     if is_heeft == 'is':
-        s2 = df2.afh_hoofdstuk.astype(object) + df2.afh_processtap
+        s2 = sleutel(df2, ['afh_hoofdstuk', 'afh_processtap'])
     else:
-        s2 = df2.hoofdstuk.astype(object) + df2.processtap
-    return s1.isin(s2)
+        s2 = sleutel(df2)
+    return pd.Series(sleutel(df1).isin(s2), index=df1.index)
+
+
+def voorop(df, columns):
+    """
+    Kolommen ``columns`` vooraan, overige kolommen in bestaande volgorde.
+    """
+    return df[[*columns, *df.columns.difference(columns, sort=False)]]
 
 
 def maak_ps(datasets):
-    ps = datasets.processtappen.copy()
-    afh = datasets.afhankelijkheden.copy()
-
-    groupby = [
-        'actor',
-        'hoofdstuk',
-        'hs_nr',
-        'processtap',
-        'ps_nr',
-        'tekst_nl',
-        'actueel',
-    ]
-    ps = ps.assign(
+    ps = datasets.processtappen
+    afh = datasets.afhankelijkheden
+
+    ps = voorop(ps, PS_GROUPBY).assign(
         is_afh = lambda df: test_afhankelijkheden(df, afh, 'is'),
         heeft_afh = lambda df: test_afhankelijkheden(df, afh, 'heeft'),
-    ).set_index(groupby).reset_index().sort_values(['actor', 'hs_nr', 'ps_nr'])
+    ).reset_index(drop=True).sort_values(['actor', 'hs_nr', 'ps_nr'])
 
     # map systeemlijst_io to children
-    query = "systeemlijst_io.notna()"
-    mapper = ps.query(query, engine='python'
-    ).set_index('ipro_id').systeemlijst_io
-    ps.parent_ipro_id = ps.parent_ipro_id.fillna(ps.ipro_id)
-    ps.systeemlijst_io = ps.parent_ipro_id.map(mapper)
-    return ps
+    mapper = ps.systeemlijst_io.set_axis(ps.ipro_id).dropna()
+    parent_ipro_id = ps.parent_ipro_id.fillna(ps.ipro_id)
+    return ps.assign(
+        parent_ipro_id=parent_ipro_id,
+        systeemlijst_io=parent_ipro_id.map(mapper),
+    )
 
 
 def maak_antw(datasets):
-    ps = datasets.processtappen.copy()
-    antw = datasets.antwoorden.copy()
-
-    groupby = [
-        'actor',
-        'hoofdstuk',
-        'hs_nr',
-        'processtap',
-        'ps_nr',
-        'tekst_nl',
-        'actueel',
-    ]
-    return (
+    ps = datasets.processtappen
+    antw = datasets.antwoorden
+
+    return voorop(
         antw
         .rename(columns={'actueel': 'actueel_antwoord'})
-        .merge(ps[groupby])
-        .set_index(groupby)
-        .reset_index()
-        .sort_values(['actor', 'hs_nr', 'ps_nr', 'volgnummer'])
-    )
+        .merge(ps[PS_GROUPBY]),
+        PS_GROUPBY,
+    ).sort_values(['actor', 'hs_nr', 'ps_nr', 'volgnummer'])
+
+
+OPL_GROUPBY = [
+    'actor',
+    'hoofdstuk',
+    'hs_nr',
+    'processtap',
+    'ps_nr',
+    'tekst_nl',
+    'tekst_en',
+    'systeemlijst_io',
+    'actueel',
+]
+OPL_KOLOMMEN = ['faculteit', 'aggregaat_1', 'aggregaat_2', 'opleiding']
 
 
 def maak_opl(datasets, pdef_ps):
@@ -66,98 +87,146 @@ def maak_opl(datasets, pdef_ps):
     Maak een overzicht van koppeling processtap-opleiding waarbij:
     - O: opleidingspecifieke vraag
     - U: universele vraag
+
+    Het overzicht wordt in lange vorm opgeslagen:
+    - stappen: processtappen met vlag `universeel` en `aantal` opleidingen
+    - koppeling: per opleidingspecifieke processtap (`stap`) de opleidingen
+      (`kolom`, positie in `kolommen`) met waarde `aanwezig`
+    - kolommen: opleidingen (faculteit/aggregaat_1/aggregaat_2/opleiding)
+    Gebruik `opl_breed` voor de brede matrix (alleen bij export).
     """
-    opl = datasets.opleidingen.copy()
-    ref = datasets.refopleiding.copy()
-
-    groupby = [
-        'actor',
-        'hoofdstuk',
-        'hs_nr',
-        'processtap',
-        'ps_nr',
-        'tekst_nl',
-        'tekst_en',
-        'systeemlijst_io',
-        'actueel',
-    ]
-    to_all = lambda row: pd.Series(
-        ['U'] * len(row),
-        index=row.index,
-        dtype=object,
-    )
     to_dtype = {'systeemlijst_io': object}
-    pdef_ps = pdef_ps[groupby].astype(to_dtype)
+    stappen = pdef_ps[OPL_GROUPBY].astype(to_dtype).reset_index(drop=True)
 
-    return (
-        opl
-        .merge(pdef_ps)
-        .merge(ref)
-        .drop_duplicates(subset=groupby + ['opleiding'])
-        .pivot(
-            index=groupby,
-            columns=['faculteit', 'aggregaat_1', 'aggregaat_2', 'opleiding'],
-            values='aanwezig')
-        .sort_index(level=[0,1,2,3], axis=1)
-        .reindex(pdef_ps.set_index(groupby).index)
-        .apply(lambda row: to_all(row) if not row.any() else row, axis=1)
-        .assign(aantal=lambda df: df.count(axis=1))
+    gekoppeld = (
+        datasets.opleidingen
+        .merge(stappen.assign(stap=stappen.index))
+        .merge(datasets.refopleiding)
+        .drop_duplicates(subset=['stap', 'opleiding'])
+    )
+    kolommen = pd.MultiIndex.from_frame(
+        gekoppeld[OPL_KOLOMMEN]
+        .drop_duplicates()
+        .sort_values(OPL_KOLOMMEN)
     )
+    koppeling = pd.DataFrame({
+        'stap': gekoppeld.stap.to_numpy(dtype='int32'),
+        'kolom': kolommen.get_indexer(
+            pd.MultiIndex.from_frame(gekoppeld[OPL_KOLOMMEN])).astype('int32'),
+        'aanwezig': gekoppeld.aanwezig.astype('category').to_numpy(),
+    })
+
+    aantal = np.bincount(koppeling.stap, minlength=len(stappen))
+    universeel = aantal == 0
+    stappen = stappen.assign(
+        universeel=universeel,
+        aantal=np.where(universeel, len(kolommen), aantal),
+    )
+    return SimpleNamespace(
+        stappen=stappen,
+        koppeling=koppeling,
+        kolommen=kolommen,
+    )
+
+
+def opl_breed(opl):
+    """
+    Brede matrix processtap x opleiding (met kolom `aantal`) uit het lange
+    overzicht van `maak_opl`.
+    """
+    values = np.full((len(opl.stappen), len(opl.kolommen)), np.nan, dtype=object)
+    values[opl.stappen.universeel.to_numpy()] = 'U'
+    values[opl.koppeling.stap, opl.koppeling.kolom] = opl.koppeling.aanwezig
+    return pd.DataFrame(
+        values,
+        index=pd.MultiIndex.from_frame(opl.stappen[OPL_GROUPBY]),
+        columns=opl.kolommen,
+        dtype=object,
+    ).assign(aantal=opl.stappen.aantal.to_numpy())
+
+
+def opl_rijen(opl):
+    """
+    Rijen (index, waarden) van de brede matrix processtap x opleiding (met
+    `aantal` als laatste waarde), één voor één opgebouwd uit het lange
+    overzicht van `maak_opl`.
+    """
+    volgorde = np.argsort(opl.koppeling.stap.to_numpy(), kind='stable')
+    stap = opl.koppeling.stap.to_numpy()[volgorde]
+    kolom = opl.koppeling.kolom.to_numpy()[volgorde]
+    aanwezig = opl.koppeling.aanwezig.to_numpy(dtype=object)[volgorde]
+    grenzen = np.searchsorted(stap, np.arange(len(opl.stappen) + 1))
+
+    n = len(opl.kolommen)
+    stappen = opl.stappen[[*OPL_GROUPBY, 'universeel', 'aantal']]
+    for i, (*index, universeel, aantal) in enumerate(stappen.itertuples(index=False)):
+        waarden = ['U'] * n if universeel else [None] * n
+        start, stop = grenzen[i], grenzen[i + 1]
+        for k, v in zip(kolom[start:stop], aanwezig[start:stop]):
+            waarden[k] = v
+        yield tuple(index), [*waarden, aantal]
 
 
 def maak_autov(dataset):
     """
     Overzicht automatische overgangen.
     """
-    def ontdubbel(data, to_merge, categories=[]):
-        merge_rows = lambda s: ';'.join(sorted(s))
-        return data.groupby(level=0).agg({
-            **{col:'first' for col in categories},
-            **{col:merge_rows for col in to_merge},
-        })
-
-    def maak_aw(data):
-        g = data.gesloten_antwoord_code
-        o = data.open_antwoord_code
-        s = data.systeem_antwoord_code
-        data['antwoord'] = g.fillna(o).fillna(s)
-        return data
-
-    processed = SimpleNamespace(**{
-        'regel': dataset.regel.query("soort == 'T'"),
-        'aanvraag': dataset.aanvraag.pipe(
-            ontdubbel,
-            to_merge = ['besluit_status']
-        ),
-        'rubriek': dataset.rubriek.pipe(
-            ontdubbel,
-            to_merge = ['status'],
-            categories = ['hoofdstuk']
-        ),
-        'processtap': dataset.processtap.pipe(
-            ontdubbel,
-            to_merge = ['status'],
-            categories = ['hoofdstuk', 'processtap']
-        ),
-        'antwoord': dataset.antwoord.pipe(maak_aw).pipe(
-            ontdubbel,
-            to_merge = ['antwoord'],
-            categories = ['hoofdstuk', 'processtap']
-        ),
-        'termijnbewaking': dataset.termijnbewaking.pipe(
-            ontdubbel,
-            to_merge = ['schaakkloktype']
-        )
-    })
-
-    volgnummers = dataset.overgang.set_index('code').volgnummer
-    get_volgnummers = lambda df: df.code.replace(volgnummers)
-    dataset.regel = dataset.regel.assign(volgnummer = get_volgnummers)
+    # bron: (categorieën (eerste waarde), samen te voegen kolom, kolom in overzicht)
+    ontdubbelen = {
+        'aanvraag': ([], 'besluit_status', 'proces'),
+        'rubriek': (['hoofdstuk'], 'status', 'status'),
+        'processtap': (['hoofdstuk', 'processtap'], 'status', 'status'),
+        'antwoord': (['hoofdstuk', 'processtap'], 'antwoord', 'antwoord'),
+        'termijnbewaking': ([], 'schaakkloktype', 'term.bew.'),
+    }
+    bronnen = pd.CategoricalDtype(['regel', *ontdubbelen], ordered=True)
 
-    to_join = {
-        k:dataset.regel.reset_index().merge(df.reset_index())
-        for k,df in vars(processed).items()
+    aw = dataset.antwoord
+    tabellen = {
+        **vars(dataset),
+        'antwoord': aw.assign(antwoord=aw.gesloten_antwoord_code
+            .fillna(aw.open_antwoord_code)
+            .fillna(aw.systeem_antwoord_code)),
     }
+    delen = pd.concat(
+        {
+            bron: tabellen[bron][[*categories, kolom]].rename(columns={kolom: 'waarde'})
+            for bron, (categories, kolom, _) in ontdubbelen.items()
+        },
+        names=['bron', 'iaor_id'],
+    )
+
+    # ontdubbel per bron/regel: eerste categorie, gesorteerde waarden samengevoegd
+    keys = ['bron', 'iaor_id']
+    samengevoegd = (
+        (';' + delen.waarde.sort_values(kind='stable'))
+        .groupby(level=keys)
+        .sum()
+        .str[1:]
+    )
+    ontdubbeld = (
+        delen
+        .groupby(level=keys)
+        [['hoofdstuk', 'processtap']]
+        .first()
+        .assign(waarde=samengevoegd)
+        .reset_index()
+    )
+    kolommen = ontdubbeld.bron.map({k:v[2] for k,v in ontdubbelen.items()})
+    ontdubbeld = ontdubbeld.assign(**{
+        kolom: ontdubbeld.waarde.where(kolommen == kolom)
+        for kolom in dict.fromkeys(v[2] for v in ontdubbelen.values())
+    }).drop(columns='waarde')
+
+    # codes zonder overgang houden hun code als volgnummer; object dtype
+    # zodat de volgnummers gehele getallen blijven
+    volgnummers = dataset.overgang.set_index('code').volgnummer.astype(object)
+    regel = dataset.regel.assign(
+        volgnummer=dataset.regel.code.map(volgnummers).fillna(dataset.regel.code),
+        positie=range(len(dataset.regel)),
+    )
+    # alleen de kolommen van de regel die in het overzicht komen
+    regelkolommen = ['volgnummer', 'code', 'type', 'soort', 'niveau', 'operator_1', 'positie']
 
     mapping_niveau = {
         'A': 'proces',
@@ -172,13 +241,16 @@ def maak_autov(dataset):
         'E': ' eind'
     }
     return (
-        pd.concat(to_join.values())
+        pd.concat([
+            regel.query("soort == 'T'").reset_index().assign(bron='regel'),
+            ontdubbeld.join(regel[regelkolommen], on='iaor_id', how='inner'),
+        ])
+        .astype({'bron': bronnen})
+        .sort_values(['bron', 'positie'], kind='stable')
         .rename(columns={
             'volgnummer': '#',
             'operator_1': 'op.',
-            'besluit_status': 'proces',
-            'hoofdstuk': 'rubriek',
-            'schaakkloktype': 'term.bew.'})
+            'hoofdstuk': 'rubriek'})
         .assign(
             niveau = lambda df: df.niveau.replace(mapping_niveau),
             soort = lambda df: df.niveau + df.soort.replace(mapping_soort))